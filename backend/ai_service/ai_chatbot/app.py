@@ -3,6 +3,7 @@ from flask_cors import CORS
 import mysql.connector
 from datetime import datetime
 import json
+import time
 import requests
 import bcrypt
 
@@ -21,6 +22,46 @@ def get_db_connection():
 # Simple In-Memory Session/Context
 user_sessions = {}
 DISEASE_PREDICTION_URL = "http://localhost:5004/predict_disease"
+DIFFERENTIAL_TOP_K = 3 # Ranked alternatives shown by the symptom checker
+
+# Symptom catalog from the disease service (fetched once, revalidated via ETag)
+SYMPTOM_CATALOG_URL = "http://localhost:5004/symptoms"
+SYMPTOM_CATALOG_REFRESH = 60 # Seconds between If-None-Match revalidations
+DEFAULT_SYMPTOM_OPTIONS = ["Fever", "Cough", "Fatigue", "Headache", "Sore Throat", "Body Pain", "Runny Nose", "Breathlessness"]
+symptom_catalog = {"etag": None, "data": None, "checked_at": 0}
+
+def get_symptom_catalog():
+    now = time.time()
+    if symptom_catalog['data'] and now - symptom_catalog['checked_at'] < SYMPTOM_CATALOG_REFRESH:
+        return symptom_catalog['data']
+    headers = {'If-None-Match': symptom_catalog['etag']} if symptom_catalog['etag'] else {}
+    try:
+        res = requests.get(SYMPTOM_CATALOG_URL, headers=headers, timeout=3)
+        if res.status_code == 200: # 304 keeps the cached copy
+            symptom_catalog['data'] = res.json()
+            symptom_catalog['etag'] = res.headers.get('ETag')
+    except Exception as e:
+        print(f"Symptom Catalog Error: {e}")
+    symptom_catalog['checked_at'] = now
+    return symptom_catalog['data']
+
+def symptom_options(limit=None):
+    catalog = get_symptom_catalog()
+    if catalog and catalog.get('catalog'):
+        names = [entry['display_name'] for entry in catalog['catalog']]
+    else:
+        names = DEFAULT_SYMPTOM_OPTIONS
+    return names[:limit] if limit else names
+
+def resolve_symptom(text):
+    # Display name, synonym or typed id -> model symptom id (e.g. 'shortness of breath' -> 'Breathlessness')
+    normalized = ' '.join(text.lower().replace('_', ' ').split())
+    catalog = get_symptom_catalog()
+    if catalog and catalog.get('lookup'):
+        symptom_id = catalog['lookup'].get(normalized) or catalog['lookup'].get(normalized.replace(' ', ''))
+        if symptom_id:
+            return symptom_id
+    return text.strip().title().replace(' ', '')
 
 def get_doctors_by_spec(spec):
     conn = get_db_connection()
@@ -132,11 +173,7 @@ def chat():
     # ==========================
     if "symptom" in message or "disease" in message or "checker" in message:
         response["text"] = "I can help you check your symptoms using our AI Diagnosis System. Please select your symptoms from the list below (click one or type several separated by commas):"
-        response["options"] = [
-            "Fever", "Cough", "Fatigue", "Headache", 
-            "Sore Throat", "Body Pain", "Runny Nose", "Breathlessness",
-            "Done ✅ (Predict)"
-        ]
+        response["options"] = symptom_options() + ["Done ✅ (Predict)"]
         user_sessions[user_id] = {'state': 'symptom_check', 'context': {'selected': []}}
         log_chat(message, response["text"])
         return jsonify(response)
@@ -148,17 +185,21 @@ def chat():
             selected = ctx.get('selected', [])
             if not selected:
                 response["text"] = "You haven't selected any symptoms. Please select at least one or type it in."
-                response["options"] = ["Fever", "Cough", "Fatigue", "Headache", "Body Pain", "Sore Throat"]
+                response["options"] = symptom_options(limit=6)
                 log_chat(message, response["text"])
                 return jsonify(response)
             
             # Call AI Service
             try:
-                ai_res = requests.post(DISEASE_PREDICTION_URL, json={"symptoms": selected})
+                # Differential comes back in the same call (one predict_proba on the service)
+                ai_res = requests.post(DISEASE_PREDICTION_URL, json={"symptoms": selected, "top_k": DIFFERENTIAL_TOP_K})
                 result = ai_res.json()
                 if result['status'] == 'success':
                     response["text"] = f"🔬 **AI-Assisted Suggestion:** {result['disease']}\n"
                     response["text"] += f"📊 **Confidence:** {result['confidence']}\n"
+                    alternatives = [d for d in result.get('differential', []) if d['disease'] != result['disease'] and d['confidence'] != '0.00%']
+                    if alternatives:
+                        response["text"] += "🩺 **Also Consider:** " + ", ".join(f"{d['disease']} ({d['confidence']})" for d in alternatives) + "\n"
                     response["text"] += f"📝 **Analyzed Symptoms:** {', '.join(selected).lower()}\n\n"
                     response["text"] += "⚠️ **Disclaimer:** This is NOT a final diagnosis. Please consult a doctor for official verification."
                     response["options"] = ["Book Appointment 📅", "Restart Menu"]
@@ -174,7 +215,7 @@ def chat():
                 return jsonify(response)
 
         # Handle Selection
-        input_symptoms = [s.strip().title().replace(' ', '') for s in message.split(',')]
+        input_symptoms = [resolve_symptom(s) for s in message.split(',') if s.strip()]
         current_selected = user_sessions[user_id]['context'].get('selected', [])
         
         for s in input_symptoms:
@@ -184,11 +225,7 @@ def chat():
         user_sessions[user_id]['context']['selected'] = current_selected
         
         response["text"] = f"Added! ✅ **Current Symptoms:** {', '.join(current_selected)}\n\nSelect more symptoms below or click 'Done' to see the prediction."
-        response["options"] = [
-            "Fever", "Cough", "Fatigue", "Headache", 
-            "Sore Throat", "Body Pain", "Runny Nose", "Breathlessness",
-            "Done ✅ (Predict)"
-        ]
+        response["options"] = symptom_options() + ["Done ✅ (Predict)"]
         log_chat(message, response["text"])
         return jsonify(response)
 
@@ -1,8 +1,10 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
-import pickle
-import numpy as np
-import os
+
+from artifact import ARTIFACT_ROOT
+from lookup_table import LOOKUP_MAX_BITS
+from registry import ModelRegistry
+from cache import TTLCache, symptom_key
 
 app = Flask(__name__)
 CORS(app)
@@ -10,53 +12,167 @@ CORS(app)
 # Load Model
 MODEL_PATH = 'disease_model.pkl'
 
-if os.path.exists(MODEL_PATH):
-    with open(MODEL_PATH, 'rb') as f:
-        model_data = pickle.load(f)
-        model = model_data['model']
-        feature_names = model_data['features']
-    print("AI Model Loaded Successfully.")
+# Repeat symptom sets are answered from memory; emptied whenever the model changes
+prediction_cache = TTLCache()
+
+# Newest artifact under ARTIFACT_ROOT (pickle as fallback), hot-swapped when retrained
+registry = ModelRegistry(ARTIFACT_ROOT, fallback_path=MODEL_PATH)
+registry.listeners.append(prediction_cache.clear)
+bundle = registry.load_initial()
+if bundle:
+    print(f"AI Model Loaded Successfully ({bundle.version}, variant '{bundle.default_variant}').")
+    if not bundle.lookup:
+        print(f"{len(bundle.feature_names)} features exceed the {LOOKUP_MAX_BITS}-bit lookup limit, using live model.")
 else:
     print("Model not found! Please run train_model.py first.")
-    model = None
-    feature_names = []
+registry.start_watcher()
+
+MAX_BATCH_SIZE = 1000
+
+def parse_top_k(data):
+    # Optional ranked differential size; None when not requested
+    top_k = data.get('top_k')
+    if top_k is None:
+        return None
+    if isinstance(top_k, bool) or not isinstance(top_k, int) or top_k < 1:
+        raise ValueError("'top_k' must be a positive integer")
+    return top_k
+
+def parse_variant(data):
+    # Optional model variant name; None selects the bundle's default
+    variant = data.get('model')
+    if variant is not None and not isinstance(variant, str):
+        raise ValueError("'model' must be a variant name")
+    return variant
+
+def parse_symptoms(symptoms, where="'symptoms'"):
+    # A list of symptom names; anything else (a bare string, null, numbers) is rejected
+    if not isinstance(symptoms, list) or not all(isinstance(s, str) for s in symptoms):
+        raise ValueError(f"{where} must be a list of symptom names")
+    return symptoms
+
+def parse_patient(patient, index):
+    # -> (id, symptoms) for a bare symptom list or {"id": ..., "symptoms": [...]}
+    if isinstance(patient, dict):
+        return patient.get('id'), parse_symptoms(patient.get('symptoms', []), f"patients[{index}].symptoms")
+    return None, parse_symptoms(patient, f"patients[{index}]")
+
+def predict_cached(model, variant, symptom_lists, top_k):
+    # Per-patient (disease, confidence, differential); only cache misses reach the model
+    keys = [symptom_key(model.version, variant, symptoms, top_k) for symptoms in symptom_lists]
+    results = [prediction_cache.get(key) for key in keys]
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        labels, confidences, differentials = model.score_symptoms([list(keys[i][2]) for i in missing], top_k, variant)
+        for j, i in enumerate(missing):
+            results[i] = (str(labels[j]), f"{confidences[j]:.2f}%", differentials[j] if differentials else None)
+            prediction_cache.put(keys[i], results[i])
+    return results
 
 @app.route('/predict_disease', methods=['POST'])
 def predict_disease():
+    data = request.json or {}
+    try:
+        symptoms = parse_symptoms(data.get('symptoms', [])) # List of symptom names e.g. ['Fever', 'Cough']
+        top_k = parse_top_k(data)
+        requested_variant = parse_variant(data)
+    except ValueError as e:
+        return jsonify({"status": "error", "msg": str(e)}), 400
+
+    with registry.acquire() as model:
+        if not model:
+            return jsonify({"status": "error", "msg": "Model not trained. Run train_model.py"}), 500
+
+        try:
+            variant, _, _ = model.resolve(requested_variant)
+        except KeyError as e:
+            return jsonify({"status": "error", "msg": e.args[0]}), 400
+
+        # Predict
+        disease, confidence, differential = predict_cached(model, variant, [symptoms], top_k)[0]
+
+        result = {
+            "status": "success",
+            "disease": disease,
+            "confidence": confidence,
+            "features_used": symptoms,
+            "model_version": model.version,
+            "model_variant": variant
+        }
+        if differential:
+            result["differential"] = differential
+        return jsonify(result)
+
+@app.route('/predict_disease_batch', methods=['POST'])
+def predict_disease_batch():
+    data = request.json or {}
+    # Each patient is either a bare symptom list or {"id": ..., "symptoms": [...]}
+    patients = data.get('patients', [])
+    if not isinstance(patients, list):
+        return jsonify({"status": "error", "msg": "'patients' must be a list"}), 400
+    if len(patients) > MAX_BATCH_SIZE:
+        return jsonify({"status": "error", "msg": f"Batch too large (max {MAX_BATCH_SIZE} patients)"}), 413
+    try:
+        top_k = parse_top_k(data)
+        requested_variant = parse_variant(data)
+        parsed = [parse_patient(p, i) for i, p in enumerate(patients)]
+    except ValueError as e:
+        return jsonify({"status": "error", "msg": str(e)}), 400
+
+    ids = [patient_id for patient_id, _ in parsed]
+    symptom_lists = [symptoms for _, symptoms in parsed]
+
+    with registry.acquire() as model:
+        if not model:
+            return jsonify({"status": "error", "msg": "Model not trained. Run train_model.py"}), 500
+
+        try:
+            variant, _, _ = model.resolve(requested_variant)
+        except KeyError as e:
+            return jsonify({"status": "error", "msg": e.args[0]}), 400
+
+        results = []
+        if symptom_lists:
+            predictions = predict_cached(model, variant, symptom_lists, top_k)
+            for patient_id, symptoms, (disease, confidence, differential) in zip(ids, symptom_lists, predictions):
+                item = {
+                    "id": patient_id,
+                    "disease": disease,
+                    "confidence": confidence,
+                    "features_used": symptoms
+                }
+                if differential:
+                    item["differential"] = differential
+                results.append(item)
+
+        return jsonify({"status": "success", "count": len(results), "results": results, "model_version": model.version, "model_variant": variant})
+
+@app.route('/symptoms', methods=['GET'])
+def get_symptoms():
+    # Return available symptoms for frontend to show (prebuilt per model version)
+    model = registry.current
     if not model:
-        return jsonify({"status": "error", "msg": "Model not trained. Run train_model.py"}), 500
-
-    data = request.json
-    symptoms = data.get('symptoms', []) # List of symptom names e.g. ['Fever', 'Cough']
-
-    # Convert symptoms to model input vector
-    input_vector = np.zeros(len(feature_names))
-    
-    for symptom in symptoms:
-        # Match symptom name to feature name (e.g. 'Fever' -> 'Symptom_Fever')
-        feature_key = f"Symptom_{symptom}"
-        if feature_key in feature_names:
-            index = feature_names.index(feature_key)
-            input_vector[index] = 1
-    
-    # Predict
-    prediction = model.predict([input_vector])[0]
-    probabilities = model.predict_proba([input_vector])[0]
-    confidence = max(probabilities) * 100
+        return jsonify({"status": "success", "symptoms": []})
+
+    catalog = model.catalog
+    headers = {"ETag": f'"{catalog.etag}"', "Cache-Control": "no-cache"}
+    if catalog.etag in request.if_none_match:
+        return Response(status=304, headers=headers)
+    return Response(catalog.body, mimetype='application/json', headers=headers)
+
+@app.route('/model', methods=['GET'])
+def model_status():
+    # Live model version plus any retired versions still draining requests
+    return jsonify({"status": "success", **registry.status()})
 
+@app.route('/stats', methods=['GET'])
+def stats():
     return jsonify({
         "status": "success",
-        "disease": prediction,
-        "confidence": f"{confidence:.2f}%",
-        "features_used": symptoms
+        "model_version": registry.current.version if registry.current else None,
+        "cache": prediction_cache.stats()
     })
 
-@app.route('/symptoms', methods=['GET'])
-def get_symptoms():
-    # Return available symptoms for frontend to show
-    clean_symptoms = [f.replace('Symptom_', '') for f in feature_names]
-    return jsonify({"status": "success", "symptoms": clean_symptoms})
-
 if __name__ == '__main__':
     print("Disease Prediction Service running on port 5004...")
     app.run(port=5004, debug=True)
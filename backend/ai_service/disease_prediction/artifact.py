@@ -0,0 +1,146 @@
+import os
+import json
+import shutil
+from datetime import datetime
+import numpy as np
+from estimators import compile_arrays
+from lookup_table import SymptomLookup
+
+# Versioned, pickle-free model artifact.
+#
+#   artifacts/<version>/manifest.json             feature names, labels, variants, array index
+#   artifacts/<version>/<variant>/<name>.npy      compiled model arrays (+ answer table)
+#
+# Arrays are opened with np.load(mmap_mode='r'), so every worker process
+# maps the same page-cache copy instead of holding its own unpickled model.
+
+ARTIFACT_ROOT = os.environ.get('DISEASE_ARTIFACT_DIR', 'artifacts')
+ARTIFACT_FORMAT = 2
+MANIFEST_NAME = 'manifest.json'
+
+# Stored in the manifest rather than as .npy files
+MANIFEST_ARRAYS = ['classes', 'features']
+LOOKUP_ARRAYS = ['proba', 'labels', 'confidence']
+
+
+def new_version():
+    return datetime.now().strftime('v%Y%m%d_%H%M%S')
+
+
+def save_artifact(variants, default_variant, root=ARTIFACT_ROOT, version=None, metrics=None):
+    # variants: {name: {"kind": ..., "arrays": {...}, "lookup": table or None, "metrics": {...}}}
+    version = version or new_version()
+    final_dir = os.path.join(root, version)
+    tmp_dir = os.path.join(root, f".{version}.tmp")
+    if os.path.exists(final_dir):
+        raise FileExistsError(f"Artifact version '{version}' already exists")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    first = variants[default_variant]['arrays']
+    manifest_variants = {}
+    for name, variant in variants.items():
+        os.makedirs(os.path.join(tmp_dir, name))
+        files, scalars = {}, {}
+        for key, array in variant['arrays'].items():
+            if key in MANIFEST_ARRAYS:
+                continue
+            array = np.asarray(array)
+            if array.ndim == 0:
+                scalars[key] = array.item()
+                continue
+            files[key] = f"{name}/{key}.npy"
+            np.save(os.path.join(tmp_dir, files[key]), np.ascontiguousarray(array))
+
+        lookup_files = {}
+        if variant.get('lookup') is not None:
+            for key in LOOKUP_ARRAYS:
+                lookup_files[key] = f"{name}/lookup_{key}.npy"
+                np.save(os.path.join(tmp_dir, lookup_files[key]), np.ascontiguousarray(variant['lookup'][key]))
+
+        manifest_variants[name] = {
+            'kind': variant['kind'],
+            'files': files,
+            'scalars': scalars,
+            'lookup_files': lookup_files,
+            'metrics': variant.get('metrics', {}),
+        }
+
+    manifest = {
+        'format': ARTIFACT_FORMAT,
+        'version': version,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'features': [str(f) for f in first['features']],
+        'classes': [str(c) for c in first['classes']],
+        'default_variant': default_variant,
+        'variants': manifest_variants,
+        'metrics': metrics or {},
+    }
+    with open(os.path.join(tmp_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    # Publish in one rename so readers never see a half-written version
+    os.replace(tmp_dir, final_dir)
+    return final_dir
+
+
+def list_versions(root=ARTIFACT_ROOT):
+    # Complete versions only (hidden .tmp directories are still being written)
+    if not os.path.isdir(root):
+        return []
+    return sorted(
+        name for name in os.listdir(root)
+        if not name.startswith('.') and os.path.exists(os.path.join(root, name, MANIFEST_NAME))
+    )
+
+
+def latest_artifact(root=ARTIFACT_ROOT):
+    versions = list_versions(root)
+    return os.path.join(root, versions[-1]) if versions else None
+
+
+def upgrade_manifest(manifest):
+    # Format 1 held a single forest with flat file names
+    files = manifest['files']
+    return {
+        **manifest,
+        'format': ARTIFACT_FORMAT,
+        'default_variant': 'forest',
+        'variants': {'forest': {
+            'kind': 'forest',
+            'files': {k: v for k, v in files.items() if not k.startswith('lookup_')},
+            'scalars': {'max_depth': manifest['max_depth']},
+            'lookup_files': {k[len('lookup_'):]: v for k, v in files.items() if k.startswith('lookup_')},
+            'metrics': manifest.get('metrics', {}),
+        }},
+    }
+
+
+def read_manifest(path):
+    with open(os.path.join(path, MANIFEST_NAME)) as f:
+        manifest = json.load(f)
+    if manifest.get('format') == 1:
+        manifest = upgrade_manifest(manifest)
+    if manifest.get('format') != ARTIFACT_FORMAT:
+        raise ValueError(f"Unsupported artifact format {manifest.get('format')} in {path}")
+    return manifest
+
+
+def load_artifact(path, mmap_mode='r'):
+    # Returns ({variant: (model, lookup or None)}, manifest) with all arrays memory-mapped
+    manifest = read_manifest(path)
+    shared = {'classes': manifest['classes'], 'features': manifest['features']}
+
+    models = {}
+    for name, variant in manifest['variants'].items():
+        arrays = {key: np.load(os.path.join(path, file_name), mmap_mode=mmap_mode) for key, file_name in variant['files'].items()}
+        model = compile_arrays(variant['kind'], {**arrays, **variant['scalars'], **shared})
+
+        lookup = None
+        if variant['lookup_files']:
+            lookup = SymptomLookup({
+                **{key: np.load(os.path.join(path, file_name), mmap_mode=mmap_mode) for key, file_name in variant['lookup_files'].items()},
+                **shared,
+            })
+        models[name] = (model, lookup)
+    return models, manifest
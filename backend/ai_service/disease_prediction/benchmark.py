@@ -0,0 +1,72 @@
+import pickle
+import subprocess
+import sys
+import numpy as np
+from forest_engine import all_symptom_combinations
+from estimators import latency_percentiles
+from artifact import latest_artifact, load_artifact, ARTIFACT_ROOT
+
+# Run after train_model.py: python benchmark.py
+# 1. Single-row latency: sklearn predict_proba vs every compiled variant
+# 2. Cold start and per-worker memory: pickle load vs memory-mapped artifact
+MODEL_PATH = 'disease_model.pkl'
+RUNS = 1000
+
+# Executed in a fresh interpreter so import and load costs are measured cold
+STARTUP_PROBE = '''
+import sys, time
+start = time.perf_counter()
+import numpy as np
+if sys.argv[1] == 'pickle':
+    import pickle
+    with open(sys.argv[2], 'rb') as f:
+        model = pickle.load(f)['model']
+else:
+    from artifact import load_artifact
+    models, manifest = load_artifact(sys.argv[2])
+    model = models[manifest['default_variant']][0]
+model.predict_proba(np.zeros((1, int(sys.argv[3]))))
+elapsed = (time.perf_counter() - start) * 1000
+mem = {}
+try:
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            key, value = line.split(':', 1)
+            if key in ('Rss', 'Pss', 'Private_Clean', 'Private_Dirty'):
+                mem[key] = int(value.split()[0]) / 1024
+except OSError:
+    try:
+        import resource
+        mem['Rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        pass # Windows: no memory figures
+print(elapsed, mem.get('Rss', 0), mem.get('Pss', 0), mem.get('Private_Clean', 0) + mem.get('Private_Dirty', 0))
+'''
+
+
+def cold_start(kind, path, n_features, runs=5):
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', STARTUP_PROBE, kind, path, str(n_features)], capture_output=True, text=True, check=True)
+        samples.append([float(v) for v in out.stdout.split()])
+    return np.median(np.array(samples), axis=0)
+
+
+with open(MODEL_PATH, 'rb') as f:
+    model_data = pickle.load(f)
+rf = model_data['model']
+artifact_path = latest_artifact(ARTIFACT_ROOT)
+models, _ = load_artifact(artifact_path)
+rows = all_symptom_combinations(len(model_data['features']))
+
+print(f"{'Path':<26}{'p50 (ms)':>12}{'p99 (ms)':>12}")
+paths = [("sklearn", rf.predict_proba)] + [(f"compiled {name}", model.predict_proba) for name, (model, _) in models.items()]
+for name, fn in paths:
+    p50, p99 = latency_percentiles(fn, rows, RUNS)
+    print(f"{name:<26}{p50:>12.3f}{p99:>12.3f}")
+
+print()
+print(f"{'Load':<20}{'cold (ms)':>12}{'RSS (MB)':>12}{'PSS (MB)':>12}{'private (MB)':>14}")
+for name, kind, path in [("pickle", 'pickle', MODEL_PATH), ("mmap artifact", 'artifact', artifact_path)]:
+    elapsed, rss, pss, private = cold_start(kind, path, len(model_data['features']))
+    print(f"{name:<20}{elapsed:>12.1f}{rss:>12.1f}{pss:>12.1f}{private:>14.1f}")
@@ -0,0 +1,74 @@
+import hashlib
+import json
+import re
+
+# Symptom catalog served by GET /symptoms.
+# Built once per model version (display names, synonyms, type-ahead prefix
+# index) and serialised once, so requests only compare ETags or copy bytes.
+
+SYMPTOM_PREFIX = 'Symptom_'
+
+# Common lay / clinical terms for the trained symptoms (keyed by symptom id)
+SYNONYMS = {
+    'Fever': ['High Temperature', 'Temperature', 'Feverish', 'Pyrexia'],
+    'Cough': ['Dry Cough', 'Wet Cough', 'Coughing'],
+    'Fatigue': ['Tiredness', 'Weakness', 'Exhaustion', 'Lethargy'],
+    'Headache': ['Head Pain', 'Head Ache'],
+    'SoreThroat': ['Throat Pain', 'Scratchy Throat', 'Pharyngitis'],
+    'BodyPain': ['Body Ache', 'Muscle Pain', 'Myalgia', 'Joint Pain'],
+    'RunnyNose': ['Nasal Discharge', 'Rhinorrhea', 'Stuffy Nose'],
+    'Breathlessness': ['Shortness Of Breath', 'Difficulty Breathing', 'Dyspnea', 'Breathing Problem'],
+}
+
+
+def display_name(symptom_id):
+    # 'SoreThroat' -> 'Sore Throat'
+    return re.sub(r'(?<=[a-z])(?=[A-Z])', ' ', symptom_id).replace('_', ' ')
+
+
+def normalize_term(term):
+    return ' '.join(str(term).lower().replace('_', ' ').split())
+
+
+class SymptomCatalog:
+
+    def __init__(self, version, feature_names):
+        self.version = version
+        entries = []
+        lookup = {}
+        prefix_index = {}
+
+        for feature in feature_names:
+            symptom_id = feature[len(SYMPTOM_PREFIX):] if feature.startswith(SYMPTOM_PREFIX) else feature
+            name = display_name(symptom_id)
+            synonyms = SYNONYMS.get(symptom_id, [])
+            entries.append({"id": symptom_id, "feature": feature, "display_name": name, "synonyms": synonyms})
+
+            for term in [symptom_id, name] + synonyms:
+                normalized = normalize_term(term)
+                lookup.setdefault(normalized, symptom_id)
+                lookup.setdefault(normalized.replace(' ', ''), symptom_id)
+                # Every word start is searchable, so 'thr' finds 'Sore Throat'
+                for word_start in [0] + [m.end() for m in re.finditer(' ', normalized)]:
+                    for end in range(word_start + 1, len(normalized) + 1):
+                        ids = prefix_index.setdefault(normalized[word_start:end], [])
+                        if symptom_id not in ids:
+                            ids.append(symptom_id)
+
+        self.entries = entries
+        self.lookup = lookup
+        self.prefix_index = prefix_index
+        self.body = json.dumps({
+            "status": "success",
+            "version": version,
+            "symptoms": [e["id"] for e in entries],
+            "catalog": entries,
+            "lookup": lookup,
+            "prefix_index": prefix_index,
+        }, separators=(',', ':')).encode('utf-8')
+        self.etag = hashlib.sha1(self.body).hexdigest()
+
+    def resolve(self, term):
+        # Free-text symptom (display name, id or synonym) -> symptom id, or None
+        normalized = normalize_term(term)
+        return self.lookup.get(normalized) or self.lookup.get(normalized.replace(' ', ''))
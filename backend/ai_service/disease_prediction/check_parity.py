@@ -0,0 +1,78 @@
+import sys
+import pickle
+import argparse
+import numpy as np
+from artifact import latest_artifact, ARTIFACT_ROOT
+from forest_engine import verify_parity, all_symptom_combinations
+from lookup_table import LOOKUP_MAX_BITS
+from registry import load_artifact_bundle
+from estimators import DEFAULT_VARIANT
+
+# Parity check of a saved artifact against the sklearn model it was exported from.
+# Loads the artifact the way the service does (memory-mapped arrays, compiled
+# engine, answer table) and compares it with the reference estimator in
+# disease_model.pkl, which train_model.py writes in the same run.
+# Run from this directory after training, or after changing the exporter /
+# loader code: python check_parity.py   (exit status 1 on any mismatch)
+RANDOM_ROWS = 10000 # rows checked when the symptom space is too large to enumerate
+
+
+def check(artifact_dir, pickle_path, atol):
+    with open(pickle_path, 'rb') as f:
+        model_data = pickle.load(f)
+    bundle = load_artifact_bundle(artifact_dir)
+    if model_data.get('version') not in (None, bundle.version):
+        raise ValueError(f"{pickle_path} was trained with artifact {model_data['version']}, not {bundle.version}")
+    if list(model_data['features']) != bundle.feature_names:
+        raise ValueError("Feature order differs between the pickle and the artifact")
+
+    reference = bundle.manifest.get('metrics', {}).get('reference_variant', DEFAULT_VARIANT)
+    sklearn_model = model_data['model']
+    engine, lookup = bundle.models[reference][0], bundle.models[reference][1]
+
+    n = len(bundle.feature_names)
+    if n <= LOOKUP_MAX_BITS:
+        X = all_symptom_combinations(n)
+    else:
+        X = np.random.default_rng(0).integers(0, 2, (RANDOM_ROWS, n)).astype(np.float64)
+
+    # 1. Compiled engine from the memory-mapped arrays
+    checked = verify_parity(sklearn_model, engine, X, atol=atol)
+    print(f"[{reference}] compiled engine matches sklearn on {checked} rows")
+
+    # 2. Answer table, indexed by symptom bitmask
+    if lookup is not None:
+        if not np.allclose(lookup.predict_proba(X), sklearn_model.predict_proba(X), rtol=0.0, atol=atol):
+            raise ValueError("Answer table probabilities diverge from sklearn")
+        labels, _ = lookup.answer(lookup.masks(X))
+        if not np.array_equal(labels.astype(str), sklearn_model.predict(X).astype(str)):
+            raise ValueError("Answer table labels diverge from sklearn")
+        print(f"[{reference}] answer table matches sklearn on {checked} rows")
+
+    # 3. The request path: symptom names -> label and confidence
+    all_symptoms = np.array([f.replace('Symptom_', '') for f in bundle.feature_names])
+    symptom_lists = [list(all_symptoms[row > 0]) for row in X[:1000]]
+    labels, confidences, _ = bundle.score_symptoms(symptom_lists, variant=reference)
+    expected = sklearn_model.predict_proba(X[:1000])
+    if not np.array_equal(np.asarray(labels).astype(str), sklearn_model.predict(X[:1000]).astype(str)):
+        raise ValueError("Served labels diverge from sklearn")
+    if not np.allclose(confidences, expected.max(axis=1) * 100, rtol=0.0, atol=atol * 100):
+        raise ValueError("Served confidences diverge from sklearn")
+    print(f"[{reference}] served predictions match sklearn on {len(symptom_lists)} symptom lists")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare a saved model artifact with its sklearn reference")
+    parser.add_argument('--artifact', help="Artifact directory (default: newest under the artifact root)")
+    parser.add_argument('--pickle', default='disease_model.pkl', help="Pickled sklearn reference model")
+    parser.add_argument('--atol', type=float, default=1e-12)
+    args = parser.parse_args()
+
+    artifact_dir = args.artifact or latest_artifact(ARTIFACT_ROOT)
+    if not artifact_dir:
+        sys.exit(f"No artifact under '{ARTIFACT_ROOT}'. Run train_model.py first.")
+    try:
+        check(artifact_dir, args.pickle, args.atol)
+    except ValueError as e:
+        sys.exit(f"PARITY FAILED ({artifact_dir}): {e}")
+    print(f"Parity OK: {artifact_dir}")
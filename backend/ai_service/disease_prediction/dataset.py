@@ -0,0 +1,118 @@
+import os
+import sys
+import time
+from contextlib import contextmanager
+import numpy as np
+
+# Chunked loading of encounter exports into a compact symptom matrix.
+# Symptom columns (Symptom_*) are 0/1 flags, so they are stored as uint8
+# (or as a sparse CSR matrix) instead of pandas' default int64/float64,
+# and the file is streamed so the full DataFrame never exists in memory.
+
+SYMPTOM_PREFIX = 'Symptom_'
+DEFAULT_CHUNKSIZE = 250_000
+
+
+def peak_rss_mb():
+    # ru_maxrss is KB on Linux, bytes on macOS; None where resource is unavailable (Windows)
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def format_mb(value):
+    return f"{value:.1f} MB" if value is not None else "n/a"
+
+
+@contextmanager
+def stage(name, report):
+    # Record wall time and peak RSS for one training stage
+    start = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - start
+    peak = peak_rss_mb()
+    report.append({"stage": name, "seconds": round(elapsed, 3), "peak_rss_mb": round(peak, 1) if peak is not None else None})
+    print(f"[{name}] {elapsed:.2f}s, peak RSS {format_mb(peak)}")
+
+
+def count_csv_rows(path):
+    # Fast newline count so the output matrix can be allocated once
+    rows = 0
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 24), b''):
+            rows += block.count(b'\n')
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b'\n':
+            rows += 1
+    return rows - 1 # header
+
+
+def iter_chunks(path, chunksize, columns=None):
+    # Yields pandas DataFrames of at most `chunksize` rows
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(path)
+        for batch in parquet.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        import pandas as pd
+        yield from pd.read_csv(path, chunksize=chunksize, usecols=columns)
+
+
+def read_header(path):
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(path)
+        return parquet.schema_arrow.names, parquet.metadata.num_rows
+    import pandas as pd
+    return list(pd.read_csv(path, nrows=0).columns), count_csv_rows(path)
+
+
+def load_symptom_matrix(path, label_column='Disease', chunksize=DEFAULT_CHUNKSIZE, sparse=False):
+    # Returns (X, y, feature_names, classes); y holds int32 codes into classes
+    columns, n_rows = read_header(path)
+    feature_names = [c for c in columns if c.startswith(SYMPTOM_PREFIX)]
+    if not feature_names:
+        raise ValueError(f"No '{SYMPTOM_PREFIX}*' columns found in {path}")
+    if label_column not in columns:
+        raise ValueError(f"Label column '{label_column}' not found in {path}")
+
+    y = np.empty(n_rows, dtype=np.int32)
+    class_codes = {}
+    if sparse:
+        indptr = [np.zeros(1, dtype=np.int64)]
+        indices, nnz = [], 0
+    else:
+        X = np.zeros((n_rows, len(feature_names)), dtype=np.uint8)
+
+    offset = 0
+    for chunk in iter_chunks(path, chunksize, feature_names + [label_column]):
+        block = chunk[feature_names].to_numpy(dtype=np.uint8, na_value=0)
+        n = len(block)
+        if sparse:
+            rows, cols = np.nonzero(block)
+            indices.append(cols.astype(np.int32))
+            indptr.append(np.bincount(rows, minlength=n).cumsum() + nnz)
+            nnz += len(cols)
+        else:
+            X[offset:offset + n] = block
+
+        labels = chunk[label_column].astype(str).to_numpy()
+        for label in np.unique(labels):
+            class_codes.setdefault(label, len(class_codes))
+        y[offset:offset + n] = [class_codes[label] for label in labels]
+        offset += n
+
+    y = y[:offset]
+    if sparse:
+        from scipy.sparse import csr_matrix
+        data = np.ones(nnz, dtype=np.float32)
+        X = csr_matrix((data, np.concatenate(indices), np.concatenate(indptr)), shape=(offset, len(feature_names)))
+    else:
+        X = X[:offset]
+
+    classes = np.array(list(class_codes), dtype=object)
+    return X, y, feature_names, classes
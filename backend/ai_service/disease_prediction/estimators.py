@@ -0,0 +1,102 @@
+import time
+import numpy as np
+from forest_engine import CompiledForest, CompiledBoosting, export_forest, export_boosting
+
+# Pluggable disease estimators.
+# Each variant is trained with sklearn but served through a compiled,
+# sklearn-free class exposing the same predict_proba / classes_ interface.
+
+DEFAULT_VARIANT = 'forest'
+
+# Variant name -> compiled kind stored in the artifact
+VARIANTS = {
+    'forest': 'forest',          # full RandomForest (100 trees)
+    'forest_pruned': 'forest',   # fewer, shallower trees
+    'boosting': 'boosting',      # gradient-boosted trees
+    'logistic': 'linear',        # multinomial logistic regression
+}
+# Trained unless --variants says otherwise. boosting fits one tree per class per stage on a
+# single core, and lbfgs logistic regression works on a dense float64 copy of the data
+# (~12 GB at 5M rows x 300 symptoms), so both are opt-in and fitted on a subsample.
+DEFAULT_TRAINED = ['forest', 'forest_pruned']
+SUBSAMPLED = {'boosting', 'logistic'}
+
+
+def make_estimator(name, n_jobs=-1, n_estimators=100, max_samples=None):
+    # sklearn is only needed by the trainer, so it is imported here
+    from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
+    from sklearn.linear_model import LogisticRegression
+
+    if name == 'forest':
+        return RandomForestClassifier(n_estimators=n_estimators, random_state=42, n_jobs=n_jobs, max_samples=max_samples)
+    if name == 'forest_pruned':
+        return RandomForestClassifier(n_estimators=max(10, n_estimators // 5), max_depth=8, min_samples_leaf=5,
+                                      random_state=42, n_jobs=n_jobs, max_samples=max_samples)
+    if name == 'boosting':
+        return GradientBoostingClassifier(n_estimators=50, max_depth=3, learning_rate=0.1, random_state=42)
+    if name == 'logistic':
+        return LogisticRegression(max_iter=1000)
+    raise ValueError(f"Unknown model variant '{name}' (choose from {', '.join(VARIANTS)})")
+
+
+def export_linear(lr, feature_names):
+    return {
+        'coef': np.asarray(lr.coef_, dtype=np.float64),
+        'intercept': np.asarray(lr.intercept_, dtype=np.float64),
+        'classes': np.array([str(c) for c in lr.classes_]),
+        'features': np.array(list(feature_names)),
+    }
+
+
+def export_model(name, estimator, feature_names):
+    kind = VARIANTS[name]
+    if kind == 'forest':
+        return export_forest(estimator, feature_names)
+    if kind == 'boosting':
+        return export_boosting(estimator, feature_names)
+    return export_linear(estimator, feature_names)
+
+
+class CompiledLinear:
+    # Logistic regression as one matrix product plus logistic / softmax link
+    kind = 'linear'
+
+    def __init__(self, arrays):
+        self.coef = arrays['coef']
+        self.intercept = arrays['intercept']
+        self.classes_ = np.array([str(c) for c in arrays['classes']], dtype=object)
+        self.feature_names = [str(f) for f in arrays['features']]
+
+    def predict_proba(self, X):
+        raw = np.asarray(X, dtype=np.float64) @ self.coef.T + self.intercept
+        if raw.shape[1] == 1:
+            p = 1.0 / (1.0 + np.exp(-raw[:, 0]))
+            return np.column_stack([1.0 - p, p])
+        raw -= raw.max(axis=1, keepdims=True)
+        proba = np.exp(raw)
+        return proba / proba.sum(axis=1, keepdims=True)
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+COMPILED_KINDS = {
+    'forest': CompiledForest,
+    'boosting': CompiledBoosting,
+    'linear': CompiledLinear,
+}
+
+
+def compile_arrays(kind, arrays):
+    return COMPILED_KINDS[kind](arrays)
+
+
+def latency_percentiles(fn, rows, runs=500):
+    # Single-row p50 / p99 latency in milliseconds
+    timings = []
+    for i in range(runs):
+        row = rows[i % len(rows)][None, :]
+        start = time.perf_counter()
+        fn(row)
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.percentile(timings, 50)), float(np.percentile(timings, 99))
@@ -0,0 +1,160 @@
+import numpy as np
+
+# Compiled tree-ensemble inference.
+# Fitted sklearn trees are flattened into contiguous NumPy arrays so the
+# service can score them without importing sklearn at request time.
+
+
+def flatten_trees(trees):
+    # Concatenate sklearn Tree objects into shared node arrays (node ids offset per tree)
+    features, thresholds, lefts, rights, roots = [], [], [], [], []
+    max_depth = 0
+    offset = 0
+
+    for tree in trees:
+        n_nodes = tree.node_count
+        is_leaf = tree.children_left == -1
+        node_ids = np.arange(n_nodes)
+
+        # Leaves point back to themselves so a fixed number of steps always lands on them
+        lefts.append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+        rights.append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+        features.append(np.where(is_leaf, 0, tree.feature))
+        thresholds.append(tree.threshold)
+        roots.append(offset)
+
+        max_depth = max(max_depth, tree.max_depth)
+        offset += n_nodes
+
+    return {
+        'feature': np.concatenate(features).astype(np.int32),
+        'threshold': np.concatenate(thresholds).astype(np.float64),
+        'left': np.concatenate(lefts).astype(np.int32),
+        'right': np.concatenate(rights).astype(np.int32),
+        'roots': np.array(roots, dtype=np.int32),
+        'max_depth': np.array(max_depth, dtype=np.int32),
+    }
+
+
+def export_forest(rf, feature_names):
+    # Flatten every tree of a fitted RandomForestClassifier into shared node arrays
+    arrays = flatten_trees([estimator.tree_ for estimator in rf.estimators_])
+
+    # Normalise leaf counts to class probabilities (same as DecisionTreeClassifier.predict_proba)
+    values = []
+    for estimator in rf.estimators_:
+        value = estimator.tree_.value[:, 0, :].astype(np.float64)
+        totals = value.sum(axis=1, keepdims=True)
+        totals[totals == 0.0] = 1.0
+        values.append(value / totals)
+
+    arrays['value'] = np.concatenate(values)
+    arrays['classes'] = np.array([str(c) for c in rf.classes_])
+    arrays['features'] = np.array(list(feature_names))
+    return arrays
+
+
+def export_boosting(gb, feature_names):
+    # Flatten a fitted GradientBoostingClassifier (one regression tree per stage and class)
+    n_stages, n_columns = gb.estimators_.shape
+    trees = [gb.estimators_[i, k].tree_ for i in range(n_stages) for k in range(n_columns)]
+    arrays = flatten_trees(trees)
+    # Leaf values pre-scaled by the learning rate, exactly as sklearn applies them per stage
+    arrays['value'] = np.concatenate([tree.value[:, 0, 0] * gb.learning_rate for tree in trees])
+    arrays['tree_class'] = np.tile(np.arange(n_columns, dtype=np.int32), n_stages)
+    arrays['classes'] = np.array([str(c) for c in gb.classes_])
+    arrays['features'] = np.array(list(feature_names))
+
+    # The init estimator's raw score is input-independent: recover it from one probe row
+    probe = np.zeros((1, len(feature_names)))
+    engine = CompiledBoosting({**arrays, 'init_raw': np.zeros(n_columns)})
+    raw = np.asarray(gb.decision_function(probe), dtype=np.float64).reshape(1, n_columns)
+    arrays['init_raw'] = (raw - engine.raw_scores(probe))[0]
+    return arrays
+
+
+def traverse(X, feature, threshold, left, right, roots, max_depth):
+    # Leaf node id reached in every tree: shape (n_samples, n_trees)
+    # sklearn compares on float32 inputs, so do the same
+    X = np.asarray(X, dtype=np.float32)
+    rows = np.arange(X.shape[0])[:, None]
+    nodes = np.broadcast_to(roots, (X.shape[0], len(roots))).copy()
+    for _ in range(max_depth):
+        go_left = X[rows, feature[nodes]] <= threshold[nodes]
+        nodes = np.where(go_left, left[nodes], right[nodes])
+    return nodes
+
+
+class CompiledForest:
+    # Drop-in replacement for the sklearn forest's predict_proba / classes_
+    kind = 'forest'
+
+    def __init__(self, arrays):
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.left = arrays['left']
+        self.right = arrays['right']
+        self.value = arrays['value']
+        self.roots = arrays['roots']
+        self.max_depth = int(arrays['max_depth'])
+        self.classes_ = np.array([str(c) for c in arrays['classes']], dtype=object)
+        self.feature_names = [str(f) for f in arrays['features']]
+
+    def apply(self, X):
+        return traverse(X, self.feature, self.threshold, self.left, self.right, self.roots, self.max_depth)
+
+    def predict_proba(self, X):
+        leaves = self.apply(X)
+        # Accumulate tree by tree, in the same order sklearn averages them
+        proba = np.zeros((leaves.shape[0], self.value.shape[1]))
+        for t in range(leaves.shape[1]):
+            proba += self.value[leaves[:, t]]
+        return proba / leaves.shape[1]
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+class CompiledBoosting(CompiledForest):
+    # Gradient-boosted trees: summed raw scores, then logistic / softmax link
+    kind = 'boosting'
+
+    def __init__(self, arrays):
+        super().__init__(arrays)
+        self.tree_class = arrays['tree_class']
+        self.init_raw = np.asarray(arrays['init_raw'], dtype=np.float64)
+
+    def raw_scores(self, X):
+        leaves = self.apply(X)
+        raw = np.tile(self.init_raw, (leaves.shape[0], 1))
+        # Stage order, as sklearn's predict_stages accumulates them
+        for t in range(leaves.shape[1]):
+            raw[:, self.tree_class[t]] += self.value[leaves[:, t]]
+        return raw
+
+    def predict_proba(self, X):
+        raw = self.raw_scores(X)
+        if raw.shape[1] == 1:
+            p = 1.0 / (1.0 + np.exp(-raw[:, 0]))
+            return np.column_stack([1.0 - p, p])
+        raw -= raw.max(axis=1, keepdims=True)
+        proba = np.exp(raw)
+        return proba / proba.sum(axis=1, keepdims=True)
+
+
+def all_symptom_combinations(n_features):
+    # Every possible binary input row (2^n_features x n_features)
+    masks = np.arange(1 << n_features)
+    return ((masks[:, None] >> np.arange(n_features)) & 1).astype(np.float64)
+
+
+def verify_parity(rf, engine, X, atol=1e-12):
+    # Compare against sklearn on the given rows (every combination for small symptom spaces)
+    expected = rf.predict_proba(X)
+    actual = engine.predict_proba(X)
+    if not np.allclose(expected, actual, rtol=0.0, atol=atol):
+        worst = np.abs(expected - actual).max()
+        raise ValueError(f"Compiled model diverges from sklearn (max abs diff {worst:.3e})")
+    if not np.array_equal(rf.predict(X).astype(str), engine.predict(X).astype(str)):
+        raise ValueError("Compiled model labels diverge from sklearn")
+    return len(X)
@@ -0,0 +1,52 @@
+import os
+import numpy as np
+from forest_engine import all_symptom_combinations
+
+# Precomputed answers for the whole binary symptom space.
+# Row `mask` holds the prediction for the input whose bit i is feature i,
+# so a request is answered with one array index instead of a model call.
+
+# Above this many features the table (2^n rows) is not built and the live model is used
+LOOKUP_MAX_BITS = int(os.environ.get('DISEASE_LOOKUP_MAX_BITS', 16))
+
+
+def build_lookup(model, feature_names):
+    X = all_symptom_combinations(len(feature_names))
+    proba = model.predict_proba(X)
+    best = proba.argmax(axis=1)
+    return {
+        'proba': proba,
+        'labels': best.astype(np.int32),
+        'confidence': proba[np.arange(len(best)), best] * 100,
+        'classes': np.array([str(c) for c in model.classes_]),
+        'features': np.array(list(feature_names)),
+    }
+
+
+class SymptomLookup:
+
+    def __init__(self, table):
+        self.proba = table['proba']
+        self.labels = table['labels']
+        self.confidence = table['confidence']
+        self.classes_ = np.array([str(c) for c in table['classes']], dtype=object)
+        self.feature_names = [str(f) for f in table['features']]
+        self.bit_weights = 1 << np.arange(len(self.feature_names), dtype=np.int64)
+
+    def masks(self, X):
+        # Binary input rows -> integer bitmasks
+        return (np.asarray(X) > 0).astype(np.int64) @ self.bit_weights
+
+    def answer(self, masks):
+        # Disease labels and confidences (%) for an array of bitmasks
+        return self.classes_[self.labels[masks]], self.confidence[masks]
+
+    def predict_proba(self, X):
+        return self.proba[self.masks(X)]
+
+
+def lookup_for_model(model, feature_names):
+    # Build the table in-process (used when the artifact does not ship one)
+    if len(feature_names) > LOOKUP_MAX_BITS:
+        return None
+    return SymptomLookup(build_lookup(model, feature_names))
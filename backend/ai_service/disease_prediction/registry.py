@@ -0,0 +1,242 @@
+import os
+import pickle
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+from artifact import list_versions, load_artifact, ARTIFACT_ROOT
+from lookup_table import lookup_for_model
+from catalog import SymptomCatalog
+from estimators import DEFAULT_VARIANT
+
+# Hot-reloadable model registry.
+# A background thread watches the artifact directory; a new version is loaded
+# and smoke-tested off the request path, then swapped in with one reference
+# assignment. Requests pin the bundle they started on, so a retired model
+# stays alive until its in-flight requests have drained.
+
+POLL_INTERVAL = float(os.environ.get('DISEASE_MODEL_POLL_SECONDS', 5))
+# Overrides the artifact's default variant (e.g. 'forest_pruned'); per-request "model" overrides both
+MODEL_VARIANT = os.environ.get('DISEASE_MODEL_VARIANT')
+
+
+class ModelBundle:
+    # Everything one model version needs to answer a request
+
+    def __init__(self, version, models, feature_names, default_variant=DEFAULT_VARIANT, manifest=None):
+        # models: {variant: (model, lookup or None)}, all trained on the same features and labels
+        self.version = version
+        self.feature_names = list(feature_names)
+        self.manifest = manifest or {}
+        # Symptom -> column lookup, built once instead of a list scan per symptom
+        self.feature_index = {name: i for i, name in enumerate(self.feature_names)}
+        # Precomputed answer table for small symptom spaces (2^n rows, n <= LOOKUP_MAX_BITS)
+        self.models = {
+            name: (model, lookup if lookup is not None else lookup_for_model(model, self.feature_names))
+            for name, (model, lookup) in models.items()
+        }
+        if MODEL_VARIANT and MODEL_VARIANT not in self.models:
+            print(f"[REGISTRY] Variant '{MODEL_VARIANT}' not in model {version}, using '{default_variant}'.")
+        self.default_variant = MODEL_VARIANT if MODEL_VARIANT in self.models else default_variant
+        # /symptoms payload and ETag, serialised once for this version
+        self.catalog = SymptomCatalog(version, self.feature_names)
+        self.in_flight = 0
+        self.retired = False
+
+    @property
+    def model(self):
+        return self.models[self.default_variant][0]
+
+    @property
+    def lookup(self):
+        return self.models[self.default_variant][1]
+
+    def resolve(self, variant=None):
+        # Variant name -> (name, model, lookup); None selects the configured default
+        name = variant or self.default_variant
+        if name not in self.models:
+            raise KeyError(f"Unknown model variant '{name}' (available: {', '.join(self.models)})")
+        model, lookup = self.models[name]
+        return name, model, lookup
+
+    def encode_symptoms(self, symptom_lists):
+        # Encode N symptom lists into one (N x features) model input matrix
+        X = np.zeros((len(symptom_lists), len(self.feature_names)))
+        for row, symptoms in enumerate(symptom_lists):
+            # Match symptom name to feature name (e.g. 'Fever' -> 'Symptom_Fever')
+            cols = [self.feature_index[f"Symptom_{s}"] for s in symptoms if f"Symptom_{s}" in self.feature_index]
+            X[row, cols] = 1
+        return X
+
+    def symptom_mask(self, symptoms):
+        # Bitmask of the known symptoms (bit i = feature i)
+        mask = 0
+        for s in symptoms:
+            col = self.feature_index.get(f"Symptom_{s}")
+            if col is not None:
+                mask |= 1 << col
+        return mask
+
+    def predict_proba_symptoms(self, symptom_lists, variant=None):
+        # Full class-probability rows: table lookup when available, one model pass otherwise
+        _, model, lookup = self.resolve(variant)
+        if lookup:
+            return lookup.proba[np.array([self.symptom_mask(s) for s in symptom_lists], dtype=np.int64)]
+        return model.predict_proba(self.encode_symptoms(symptom_lists))
+
+    def differential(self, probabilities, top_k, classes):
+        # k most likely diseases per row; argpartition avoids sorting every class
+        k = min(top_k, probabilities.shape[1])
+        if k < probabilities.shape[1]:
+            top = np.argpartition(-probabilities, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(k), (len(probabilities), 1))
+        top_proba = np.take_along_axis(probabilities, top, axis=1)
+        order = np.argsort(-top_proba, axis=1, kind='stable')
+        top = np.take_along_axis(top, order, axis=1)
+        top_proba = np.take_along_axis(top_proba, order, axis=1)
+        return [
+            [{"disease": str(classes[c]), "confidence": f"{p * 100:.2f}%"} for c, p in zip(row, row_proba)]
+            for row, row_proba in zip(top, top_proba)
+        ]
+
+    def score_symptoms(self, symptom_lists, top_k=None, variant=None):
+        # Returns (labels, confidences, differentials or None) from a single probability pass
+        _, model, lookup = self.resolve(variant)
+        if lookup and not top_k:
+            labels, confidences = lookup.answer(np.array([self.symptom_mask(s) for s in symptom_lists], dtype=np.int64))
+            return labels, confidences, None
+        probabilities = self.predict_proba_symptoms(symptom_lists, variant)
+        best = probabilities.argmax(axis=1)
+        confidences = probabilities[np.arange(len(best)), best] * 100
+        differentials = self.differential(probabilities, top_k, model.classes_) if top_k else None
+        return model.classes_[best], confidences, differentials
+
+    def smoke_test(self):
+        # Score "no symptoms" and "all symptoms" through every variant before going live
+        X = np.array([np.zeros(len(self.feature_names)), np.ones(len(self.feature_names))])
+        all_symptoms = [f.replace('Symptom_', '') for f in self.feature_names]
+        for name, (model, _) in self.models.items():
+            probabilities = model.predict_proba(X)
+            if probabilities.shape != (2, len(model.classes_)):
+                raise ValueError(f"{name}: unexpected probability shape {probabilities.shape}")
+            if not np.allclose(probabilities.sum(axis=1), 1.0):
+                raise ValueError(f"{name}: class probabilities do not sum to 1")
+            labels, _, differentials = self.score_symptoms([[], all_symptoms], top_k=3, variant=name)
+            if len(labels) != 2 or len(differentials) != 2:
+                raise ValueError(f"{name}: smoke prediction returned the wrong number of rows")
+
+    def variants(self):
+        described = self.manifest.get('variants', {})
+        return {name: {"kind": getattr(model, 'kind', 'sklearn'), "metrics": described.get(name, {}).get('metrics', {})}
+                for name, (model, _) in self.models.items()}
+
+
+def load_pickle_bundle(path):
+    # Legacy fallback: full sklearn object graph
+    with open(path, 'rb') as f:
+        model_data = pickle.load(f)
+    return ModelBundle('pickle', {DEFAULT_VARIANT: (model_data['model'], None)}, model_data['features'])
+
+
+def load_artifact_bundle(path):
+    # Versioned artifact: memory-mapped NumPy arrays, no pickle and no sklearn
+    models, manifest = load_artifact(path)
+    return ModelBundle(manifest['version'], models, manifest['features'], manifest['default_variant'], manifest)
+
+
+class ModelRegistry:
+
+    def __init__(self, root=ARTIFACT_ROOT, fallback_path=None, poll_interval=POLL_INTERVAL):
+        self.root = root
+        self.fallback_path = fallback_path
+        self.poll_interval = poll_interval
+        self.current = None
+        self.draining = []
+        self.rejected = set()
+        self.listeners = [] # called with the new bundle after every swap
+        self.lock = threading.Lock()
+        self.watcher = None
+
+    def load_initial(self):
+        if not self.check_for_update() and self.fallback_path and os.path.exists(self.fallback_path):
+            self.swap(load_pickle_bundle(self.fallback_path))
+        return self.current
+
+    @contextmanager
+    def acquire(self):
+        # Pin the current bundle for the duration of one request
+        with self.lock:
+            bundle = self.current
+            if bundle:
+                bundle.in_flight += 1
+        try:
+            yield bundle
+        finally:
+            if bundle:
+                self.release(bundle)
+
+    def release(self, bundle):
+        with self.lock:
+            bundle.in_flight -= 1
+            if bundle.retired and bundle.in_flight == 0 and bundle in self.draining:
+                self.draining.remove(bundle)
+                print(f"[REGISTRY] Model {bundle.version} drained and released.")
+
+    def swap(self, bundle):
+        with self.lock:
+            old = self.current
+            self.current = bundle
+            if old:
+                old.retired = True
+                if old.in_flight:
+                    self.draining.append(old)
+        print(f"[REGISTRY] Serving model {bundle.version}.")
+        for listener in self.listeners:
+            listener(bundle)
+        return old
+
+    def check_for_update(self):
+        # Load, validate and publish the newest artifact if it is not live yet
+        versions = list_versions(self.root)
+        if not versions:
+            return False
+        latest = versions[-1]
+        current = self.current
+        if latest in self.rejected:
+            return False
+        if current and current.version != 'pickle' and latest <= current.version:
+            return False
+        try:
+            bundle = load_artifact_bundle(os.path.join(self.root, latest))
+            bundle.smoke_test()
+        except Exception as e:
+            self.rejected.add(latest)
+            print(f"[REGISTRY] Rejected model {latest}: {e}")
+            return False
+        self.swap(bundle)
+        return True
+
+    def start_watcher(self):
+        if self.watcher:
+            return
+        self.watcher = threading.Thread(target=self._watch, daemon=True)
+        self.watcher.start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.check_for_update()
+            except Exception as e:
+                print(f"[REGISTRY] Watcher error: {e}")
+
+    def status(self):
+        with self.lock:
+            return {
+                "version": self.current.version if self.current else None,
+                "default_variant": self.current.default_variant if self.current else None,
+                "variants": self.current.variants() if self.current else {},
+                "in_flight": self.current.in_flight if self.current else 0,
+                "draining": [{"version": b.version, "in_flight": b.in_flight} for b in self.draining],
+            }
@@ -1,56 +1,169 @@
+import argparse
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier
 import pickle
 import os
+from forest_engine import verify_parity, all_symptom_combinations
+from estimators import VARIANTS, DEFAULT_VARIANT, DEFAULT_TRAINED, SUBSAMPLED, make_estimator, export_model, compile_arrays, latency_percentiles
+from lookup_table import build_lookup, LOOKUP_MAX_BITS
+from artifact import save_artifact, new_version, ARTIFACT_ROOT
+from dataset import load_symptom_matrix, stage, format_mb, DEFAULT_CHUNKSIZE
 
-# 1. Create/Load Dataset (Simulating Real Medical Data)
-# In a real scenario, this would load 'medical_data.csv'
-data = {
-    'Symptom_Fever': [1, 0, 1, 1, 0, 0, 1, 1, 0, 1, 1, 0],
-    'Symptom_Cough': [1, 1, 0, 1, 0, 0, 1, 1, 1, 0, 0, 1],
-    'Symptom_Fatigue': [1, 1, 1, 1, 1, 0, 1, 0, 0, 1, 1, 0],
-    'Symptom_Headache': [0, 0, 1, 1, 0, 1, 0, 1, 0, 1, 0, 1],
-    'Symptom_SoreThroat': [0, 1, 0, 0, 0, 0, 1, 0, 1, 0, 0, 1],
-    'Symptom_BodyPain': [1, 0, 1, 1, 0, 1, 0, 1, 0, 1, 1, 0],
-    'Symptom_RunnyNose': [0, 1, 0, 0, 0, 0, 1, 0, 1, 0, 0, 1],
-    'Symptom_Breathlessness': [0, 0, 0, 1, 0, 0, 0, 1, 0, 0, 0, 1],
-    'Disease': [
-        'Viral Fever', 'Common Cold', 'Malaria', 'Covid-19', 'Fatigue', 'Migraine',
-        'Viral Fever', 'Covid-19', 'Common Cold', 'Malaria', 'Typhoid', 'Asthma'
-    ]
-}
+parser = argparse.ArgumentParser(description="Train the disease prediction models")
+parser.add_argument('--data', help="CSV or Parquet export with Symptom_* columns (omit for the built-in demo set)")
+parser.add_argument('--label-column', default='Disease')
+parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, help="Rows read per chunk")
+parser.add_argument('--sparse', action='store_true', help="Hold symptoms as a sparse matrix (best for wide, mostly-empty data)")
+parser.add_argument('--n-jobs', type=int, default=-1, help="Cores used for fitting (-1 = all)")
+parser.add_argument('--n-estimators', type=int, default=100)
+parser.add_argument('--max-samples', type=float, default=None, help="Bootstrap sample fraction per tree (e.g. 0.1 on very large data)")
+parser.add_argument('--variants', default=','.join(DEFAULT_TRAINED),
+                    help=f"Comma-separated model variants to train ({', '.join(VARIANTS)}). boosting is single-threaded and "
+                         f"logistic makes a dense float64 copy of its rows (~8 bytes x rows x symptoms), so both are "
+                         f"opt-in and fitted on at most --subsample-rows rows")
+parser.add_argument('--subsample-rows', type=int, default=200_000, help="Row cap for the boosting / logistic fits")
+parser.add_argument('--auto-default', action='store_true', help="Serve the fastest variant within --accuracy-tolerance instead of the forest")
+parser.add_argument('--accuracy-tolerance', type=float, default=0.01, help="Max accuracy drop vs the full forest for --auto-default")
+args = parser.parse_args()
+
+report = []
+
+
+def labelled_rows(X, y, chunk=10000):
+    # (symptom bytes, label) per row, for spotting test rows that also occur in training
+    rows = set()
+    for start in range(0, X.shape[0], chunk):
+        block = X[start:start + chunk]
+        block = np.ascontiguousarray(block.toarray() if hasattr(block, 'toarray') else block, dtype=np.uint8)
+        rows.update(zip(map(bytes, block), y[start:start + chunk]))
+    return rows
+
+
+# 1. Create/Load Dataset
+with stage("load", report):
+    if args.data:
+        # Stream the export chunk by chunk into a uint8 (or sparse) matrix
+        X, y_codes, feature_names, classes = load_symptom_matrix(args.data, args.label_column, args.chunksize, args.sparse)
+        y = classes[y_codes]
+    else:
+        # Built-in demo set (Simulating Real Medical Data)
+        data = {
+            'Symptom_Fever': [1, 0, 1, 1, 0, 0, 1, 1, 0, 1, 1, 0],
+            'Symptom_Cough': [1, 1, 0, 1, 0, 0, 1, 1, 1, 0, 0, 1],
+            'Symptom_Fatigue': [1, 1, 1, 1, 1, 0, 1, 0, 0, 1, 1, 0],
+            'Symptom_Headache': [0, 0, 1, 1, 0, 1, 0, 1, 0, 1, 0, 1],
+            'Symptom_SoreThroat': [0, 1, 0, 0, 0, 0, 1, 0, 1, 0, 0, 1],
+            'Symptom_BodyPain': [1, 0, 1, 1, 0, 1, 0, 1, 0, 1, 1, 0],
+            'Symptom_RunnyNose': [0, 1, 0, 0, 0, 0, 1, 0, 1, 0, 0, 1],
+            'Symptom_Breathlessness': [0, 0, 0, 1, 0, 0, 0, 1, 0, 0, 0, 1],
+            'Disease': [
+                'Viral Fever', 'Common Cold', 'Malaria', 'Covid-19', 'Fatigue', 'Migraine',
+                'Viral Fever', 'Covid-19', 'Common Cold', 'Malaria', 'Typhoid', 'Asthma'
+            ]
+        }
+
+        # Expand dataset to mimic larger data (Synthetic oversampling for demo)
+        df = pd.DataFrame(data)
+        df = pd.concat([df]*50, ignore_index=True) # Multiply data to simulate training scale
+        feature_names = [c for c in df.columns if c != 'Disease']
+        X = df[feature_names].to_numpy(dtype=np.uint8)
+        y = df['Disease'].to_numpy()
 
-# Expand dataset to mimic larger data (Synthetic oversampling for demo)
-df = pd.DataFrame(data)
-df = pd.concat([df]*50, ignore_index=True) # Multiply data to simulate training scale
+print(f"Dataset Loaded: {X.shape[0]} records, {X.shape[1]} symptoms")
 
-print(f"Dataset Loaded: {df.shape[0]} records")
+# 2. Train Test Split
+with stage("split", report):
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
-# 2. Preprocessing
-X = df.drop('Disease', axis=1)
-y = df['Disease']
+# Rows used for parity checks, latency and the answer table
+if len(feature_names) <= LOOKUP_MAX_BITS:
+    X_check = all_symptom_combinations(len(feature_names))
+else:
+    X_check = X_test[:10000]
+    X_check = X_check.toarray() if hasattr(X_check, 'toarray') else X_check
 
-# 3. Train Test Split
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+variants = {}
+estimators = {}
+for name in [v.strip() for v in args.variants.split(',') if v.strip()]:
+    # 3. Model Training
+    print(f"Training AI Model ({name})...")
+    with stage(f"fit:{name}", report):
+        estimator = make_estimator(name, args.n_jobs, args.n_estimators, args.max_samples)
+        if name in SUBSAMPLED and X_train.shape[0] > args.subsample_rows:
+            rows = np.sort(np.random.default_rng(42).choice(X_train.shape[0], args.subsample_rows, replace=False))
+            print(f"Fitting {name} on a {args.subsample_rows}-row subsample")
+            estimator.fit(X_train[rows], y_train[rows])
+        else:
+            estimator.fit(X_train, y_train)
+    estimators[name] = estimator
 
-# 4. Model Training (Random Forest)
-print("Training AI Model...")
-rf = RandomForestClassifier(n_estimators=100, random_state=42)
-rf.fit(X_train, y_train)
+    # 4. Evaluation
+    with stage(f"evaluate:{name}", report):
+        accuracy = estimator.score(X_test, y_test)
+    print(f"Model Training Complete ({name}). Accuracy: {accuracy * 100:.2f}%")
 
-# 5. Evaluation
-accuracy = rf.score(X_test, y_test)
-print(f"Model Training Complete. Accuracy: {accuracy * 100:.2f}%")
+    # 5. Export Compiled Model (sklearn-free inference for the service)
+    with stage(f"export:{name}", report):
+        arrays = export_model(name, estimator, feature_names)
+        engine = compile_arrays(VARIANTS[name], arrays)
+        checked = verify_parity(estimator, engine, X_check, atol=1e-12 if VARIANTS[name] == 'forest' else 1e-9)
+    print(f"Compiled {name} verified against sklearn on {checked} symptom combinations.")
 
-# 6. Save Model & Columns
+    # 6. Precompute Answer Table (every symptom combination -> disease & confidence)
+    lookup_table = None
+    if len(feature_names) <= LOOKUP_MAX_BITS:
+        lookup_table = build_lookup(estimator, feature_names)
+
+    p50, p99 = latency_percentiles(engine.predict_proba, X_check)
+    variants[name] = {
+        'kind': VARIANTS[name],
+        'arrays': arrays,
+        'lookup': lookup_table,
+        'metrics': {'accuracy': accuracy, 'p50_ms': p50, 'p99_ms': p99},
+    }
+
+if len(feature_names) > LOOKUP_MAX_BITS:
+    print(f"Skipping answer tables: {len(feature_names)} features exceed the {LOOKUP_MAX_BITS}-bit limit")
+
+# 7. Default variant: the full forest, or (--auto-default) the fastest within tolerance of it
+reference = DEFAULT_VARIANT if DEFAULT_VARIANT in variants else max(variants, key=lambda n: variants[n]['metrics']['accuracy'])
+default_variant = reference
+if args.auto_default:
+    # Accuracy only ranks variants when the test split holds examples the models have not seen
+    if not labelled_rows(X_test, y_test) - labelled_rows(X_train, y_train):
+        print(f"Every test row also occurs in the training split; keeping '{reference}' as the default")
+    else:
+        floor = variants[reference]['metrics']['accuracy'] - args.accuracy_tolerance
+        eligible = [n for n in variants if variants[n]['metrics']['accuracy'] >= floor]
+        default_variant = min(eligible, key=lambda n: variants[n]['metrics']['p50_ms'])
+
+print("\nAccuracy vs latency (compiled, single row):")
+print(f"  {'Variant':<16}{'accuracy':>10}{'p50 (ms)':>12}{'p99 (ms)':>12}")
+for name, variant in variants.items():
+    m = variant['metrics']
+    marker = '  <- default' if name == default_variant else ''
+    print(f"  {name:<16}{m['accuracy'] * 100:>9.2f}%{m['p50_ms']:>12.3f}{m['p99_ms']:>12.3f}{marker}")
+
+# 8. Save Model & Columns (legacy pickle of the reference model)
+version = new_version()
 model_data = {
-    'model': rf,
-    'features': list(X.columns)
+    'model': estimators[reference],
+    'features': list(feature_names),
+    'version': version # artifact trained in the same run, checked by check_parity.py
 }
 
-with open('disease_model.pkl', 'wb') as f:
-    pickle.dump(model_data, f)
+with stage("save_pickle", report):
+    with open('disease_model.pkl', 'wb') as f:
+        pickle.dump(model_data, f)
 
 print("Model saved to 'disease_model.pkl'")
+
+# 9. Save Versioned Artifact (JSON manifest + memory-mappable .npy arrays)
+metrics = {'rows': int(X.shape[0]), 'reference_variant': reference, 'auto_default': args.auto_default, 'accuracy_tolerance': args.accuracy_tolerance, 'stages': report}
+artifact_dir = save_artifact(variants, default_variant, ARTIFACT_ROOT, version=version, metrics=metrics)
+print(f"Artifact saved to '{artifact_dir}'")
+
+print("\nStage report:")
+for entry in report:
+    print(f"  {entry['stage']:<20}{entry['seconds']:>10.2f}s{format_mb(entry['peak_rss_mb']):>12} peak")
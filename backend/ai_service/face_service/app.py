@@ -1,7 +1,6 @@
 import os
 import cv2
 import numpy as np
-import mysql.connector
 import json
 import datetime
 import threading
@@ -9,7 +8,10 @@ import time
 import logging
 from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
-# from deepface import DeepFace # Moved to function scope
+from gallery import FaceGallery
+from database import get_db
+from embedding_store import encode_embedding, decode_rows, face_columns, forget_columns, save_snapshot, load_snapshot, UNKNOWN_COLUMN
+from face_model import FaceSession
 
 # MediaPipe is disabled to prevent protobuf conflicts on Windows
 HAS_MEDIAPIPE = False
@@ -18,28 +20,142 @@ app = Flask(__name__)
 CORS(app)
 
 # --- Global Cache for Speed ---
-embedding_cache = [] # List of {user_id, name, embedding_vec}
+embedding_cache = FaceGallery.empty() # Normalized embedding matrix + parallel face / user ids, names
+cache_lock = threading.RLock() # Serializes writers (full loads, appends, deletes, reconciliation); searches only wait for the short in-memory update
+
+# --- Face Model (loaded once at boot, see face_model.py) ---
+face_session = FaceSession()
+startup = {"ready": False, "error": None}
+
+def initialize():
+    try:
+        print("[BOOT] Loading face model...")
+        load_s = face_session.load()
+        warmup_s = face_session.warm_up()
+        startup["ready"] = True
+        stats = face_session.stats
+        print(f"[BOOT] Face model ready in {(load_s + warmup_s) * 1000:.0f} ms (cold pass {stats['cold_ms']} ms, warm pass {stats['warm_ms']} ms)")
+    except Exception as e:
+        startup["error"] = str(e)
+        print(f"[BOOT ERROR] Face model initialization failed: {e}")
+
+def model_not_ready():
+    msg = "Face model is still loading, please try again shortly." if not startup["error"] else "Face model failed to load."
+    return jsonify({"status":"error", "msg":msg}), 503
+
+# Cosine distance thresholds
+DUPLICATE_THRESHOLD = 0.35 # Stricter Threshold for Registration
+MATCH_THRESHOLD = 0.48 # Relaxed Threshold (Friendly Mode)
+
+# Background reconciliation with ai_faces (rows written by other processes / admin tools)
+RECONCILE_SECONDS = int(os.environ.get('FACE_RECONCILE_SECONDS', 30))
+COMPACT_TOMBSTONE_RATIO = 0.25 # Full reload once this share of rows is deleted
+RECONCILE_CHUNK = 1000 # face_ids per IN (...) fetch
+snapshot_state = None # (gallery, version) last written to the on-disk snapshot
+
+def face_query(cursor):
+    # Reads the packed embedding_bin column once migrate_embeddings.py has added it, JSON otherwise
+    columns = ", ".join(f"f.{column}" for column in face_columns(cursor))
+    return f"SELECT f.face_id, f.user_id, {columns}, u.first_name, u.last_name FROM ai_faces f JOIN Users u ON f.user_id = u.user_id"
+
+def select_faces(cursor, clause="", params=()):
+    # Face rows with their embeddings; re-probes the columns once if a migration changed them
+    try:
+        cursor.execute(face_query(cursor) + clause, params)
+    except Exception as e:
+        if getattr(e, 'errno', None) != UNKNOWN_COLUMN:
+            raise
+        forget_columns()
+        cursor.execute(face_query(cursor) + clause, params)
+    return cursor.fetchall()
+
+def write_snapshot(gallery):
+    global snapshot_state
+    try:
+        gallery.upgrade_index()
+        version, *data = gallery.snapshot()
+        save_snapshot(*data)
+        gallery.persist_index()
+        snapshot_state = (id(gallery), version)
+    except Exception as e:
+        print(f"[CACHE ERROR] Could not write gallery snapshot: {e}")
+
+def boot_cache():
+    # Memory-mapped snapshot first (no MySQL on the boot path), then reconciliation catches up
+    global embedding_cache, snapshot_state
+    with cache_lock:
+        try:
+            start = time.perf_counter()
+            snapshot = load_snapshot()
+            if snapshot and len(snapshot["face_ids"]):
+                embedding_cache = FaceGallery(snapshot["user_ids"], snapshot["names"], snapshot["matrix"],
+                                              face_ids=snapshot["face_ids"], normalized=True)
+                snapshot_state = (id(embedding_cache), embedding_cache.version)
+                print(f"[CACHE] Loaded {len(embedding_cache)} biometric records from snapshot in {(time.perf_counter() - start) * 1000:.1f} ms.")
+                return
+        except Exception as e:
+            print(f"[CACHE ERROR] Could not open gallery snapshot: {e}")
+        load_cache()
 
 def load_cache():
     global embedding_cache
-    try:
+    with cache_lock:
+        try:
+            db = get_db(); c = db.cursor(dictionary=True)
+            # Insertion order, so faces appended since the last load keep their rows (and persisted index)
+            rows = select_faces(c, " ORDER BY f.face_id")
+            db.close()
+            
+            # Built off to the side and swapped in whole, so readers never see a partial gallery
+            embedding_cache = FaceGallery(
+                [r['user_id'] for r in rows],
+                [f"{r['first_name']} {r['last_name']}" for r in rows],
+                decode_rows(rows),
+                face_ids=[r['face_id'] for r in rows]
+            ) if rows else FaceGallery.empty()
+            print(f"[CACHE] Loaded {len(embedding_cache)} biometric records.")
+            write_snapshot(embedding_cache)
+        except Exception as e:
+            print(f"[CACHE ERROR] Could not prime cache: {e}")
+
+def reconcile_cache():
+    # Diff the full face_id set with the database: ids are allocated at insert time, not commit
+    # time, so a row can appear below ids already applied. New rows go in as one batch.
+    with cache_lock:
+        gallery = embedding_cache
         db = get_db(); c = db.cursor(dictionary=True)
-        c.execute("SELECT f.user_id, f.embedding, u.first_name, u.last_name FROM ai_faces f JOIN Users u ON f.user_id = u.user_id")
-        rows = c.fetchall()
+        c.execute("SELECT face_id FROM ai_faces")
+        present = {r['face_id'] for r in c.fetchall()}
+        missing = sorted(present - set(gallery.face_ids.tolist()))
+        new_rows = []
+        for start in range(0, len(missing), RECONCILE_CHUNK):
+            chunk = missing[start:start + RECONCILE_CHUNK]
+            new_rows.extend(select_faces(c, f" WHERE f.face_id IN ({', '.join(['%s'] * len(chunk))}) ORDER BY f.face_id", chunk))
         db.close()
-        
-        new_cache = []
-        for r in rows:
-            emb = np.array(json.loads(r['embedding']))
-            new_cache.append({
-                "user_id": r['user_id'],
-                "full_name": f"{r['first_name']} {r['last_name']}",
-                "embedding": emb
-            })
-        embedding_cache = new_cache
-        print(f"[CACHE] Loaded {len(embedding_cache)} biometric records.")
-    except Exception as e:
-        print(f"[CACHE ERROR] Could not prime cache: {e}")
+
+        added = gallery.add_many(
+            [r['face_id'] for r in new_rows],
+            [r['user_id'] for r in new_rows],
+            [f"{r['first_name']} {r['last_name']}" for r in new_rows],
+            decode_rows(new_rows)
+        ) if new_rows else 0
+        removed = gallery.remove(face_ids=[f for f in gallery.live_face_ids().tolist() if f not in present])
+        if added or removed:
+            print(f"[CACHE] Reconciled: +{added} / -{removed} biometric records.")
+        if gallery.tombstone_ratio() > COMPACT_TOMBSTONE_RATIO:
+            load_cache()
+        elif snapshot_state != (id(gallery), gallery.version):
+            # Also picks up /register and /unregister changes made since the last pass
+            write_snapshot(gallery)
+
+def reconcile_loop():
+    # First pass right away: a snapshot may be behind the database
+    while True:
+        try:
+            reconcile_cache()
+        except Exception as e:
+            print(f"[CACHE ERROR] Reconciliation failed: {e}")
+        time.sleep(RECONCILE_SECONDS)
 
 class BiometricCore(threading.Thread):
     def __init__(self):
@@ -192,14 +308,12 @@ class BiometricCore(threading.Thread):
 core = BiometricCore()
 core.start()
 
-# --- Database ---
-def get_db():
-    return mysql.connector.connect(host="localhost", user="root", password="", database="medisphere_shms")
-
 # --- Routes ---
 @app.route('/health')
 def health():
-    return jsonify({"status": "alive", "camera": core.cap is not None})
+    # 503 until Facenet and the detectors are loaded and warmed up
+    status = "ready" if startup["ready"] else "error" if startup["error"] else "loading"
+    return jsonify({"status": status, "camera": core.cap is not None, **startup, "latency": face_session.latency()}), 200 if startup["ready"] else 503
 
 @app.route('/start_camera', methods=['GET', 'POST'])
 def start_camera():
@@ -245,28 +359,11 @@ def register():
     user_id = data.get('user_id')
     frame = core.get_frame()
     if frame is None: return jsonify({"status":"error", "msg":"Camera not ready"})
+    if not startup["ready"]: return model_not_ready()
 
     try:
-        from deepface import DeepFace
-        
-        # --- Pre-processing: Auto-Enhance ---
-        # Convert to LAB to normalize brightness
-        lab = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB)
-        l, a, b = cv2.split(lab)
-        clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8,8))
-        cl = clahe.apply(l)
-        enhanced_frame = cv2.merge((cl,a,b))
-        enhanced_frame = cv2.cvtColor(enhanced_frame, cv2.COLOR_LAB2BGR)
-
-        # Capture & Process with Fallback Detector
-        try:
-            res = DeepFace.represent(enhanced_frame, model_name='Facenet', detector_backend='opencv', enforce_detection=True)
-        except Exception as e_inner:
-            print(f"[RETRY] Opencv failed, trying retinaface: {e_inner}")
-            res = DeepFace.represent(enhanced_frame, model_name='Facenet', detector_backend='retinaface', enforce_detection=True)
-        
-        emb = np.array(res[0]['embedding'])
-        box = res[0]['facial_area'] # x, y, w, h
+        # Auto-enhance + Facenet, opencv detector with RetinaFace fallback
+        emb, box = face_session.embed(frame)
         
         db = get_db(); c = db.cursor(dictionary=True)
         
@@ -279,53 +376,60 @@ def register():
         if not embedding_cache:
             load_cache()
 
-        for face in embedding_cache:
-            # Manual Cosine Similarity: 1 - (A . B) / (||A|| * ||B||)
-            a = emb; b = face['embedding']
-            dist = 1 - np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
-            
-            if dist < 0.35: # Stricter Threshold for Registration
-                name = face['full_name']
-                core.set_ui_status("Identity Conflict", (0, 0, 255), name, (box['x'], box['y'], box['w'], box['h']))
-                return jsonify({"status":"error", "msg":f"Denied: This face already belongs to {name}."})
+        # Closest enrolled face (one matrix-vector product over the whole gallery)
+        conflict = embedding_cache.match(emb, DUPLICATE_THRESHOLD)
+        if conflict:
+            name = conflict[1]
+            core.set_ui_status("Identity Conflict", (0, 0, 255), name, (box['x'], box['y'], box['w'], box['h']))
+            return jsonify({"status":"error", "msg":f"Denied: This face already belongs to {name}."})
 
         # 3. Success -> Register
         now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        c.execute("INSERT INTO ai_faces (user_id, embedding, created_at) VALUES (%s, %s, %s)", 
-                  (user_id, json.dumps(emb.tolist()), now))
+        if 'embedding_bin' in face_columns(c):
+            c.execute("INSERT INTO ai_faces (user_id, embedding_bin, created_at) VALUES (%s, %s, %s)", 
+                      (user_id, encode_embedding(emb), now))
+        else:
+            c.execute("INSERT INTO ai_faces (user_id, embedding, created_at) VALUES (%s, %s, %s)", 
+                      (user_id, json.dumps(emb.tolist()), now))
+        face_id = c.lastrowid
         
+        c.execute("SELECT first_name, last_name FROM Users WHERE user_id = %s", (user_id,))
+        user = c.fetchone()
         db.commit(); db.close()
-        load_cache() # Refresh Cache
+        # Incremental insert (matrix + index) instead of reloading every face
+        with cache_lock:
+            embedding_cache.add(face_id, user_id, f"{user['first_name']} {user['last_name']}", emb)
         core.set_ui_status("Registered Successfully", (0, 255, 0), "Success", (box['x'], box['y'], box['w'], box['h']))
         return jsonify({"status":"success", "msg":f"Staff Face Registered Successfully!"})
     except Exception as e:
         core.set_ui_status("Registration Error", (0, 0, 255))
         return jsonify({"status":"error", "msg":"Could not detect face. Please center yourself and try again."})
 
+@app.route('/unregister', methods=['POST'])
+def unregister():
+    user_id = (request.json or {}).get('user_id')
+    if not user_id: return jsonify({"status":"error", "msg":"user_id is required"})
+
+    db = get_db(); c = db.cursor()
+    c.execute("DELETE FROM ai_faces WHERE user_id = %s", (user_id,))
+    deleted = c.rowcount
+    db.commit(); db.close()
+    # In-place delete (tombstone) instead of reloading every face
+    with cache_lock:
+        embedding_cache.remove(user_id=user_id)
+    if not deleted:
+        return jsonify({"status":"error", "msg":"No biometric record found for this staff member."})
+    return jsonify({"status":"success", "msg":"Biometric record removed."})
+
 @app.route('/mark_attendance', methods=['POST'])
 def mark_attendance():
     frame = core.get_frame()
     if frame is None: return jsonify({"status":"error", "msg":"Camera not ready"})
+    if not startup["ready"]: return model_not_ready()
 
     try:
-        from deepface import DeepFace
-        
-        # --- Pre-processing: Auto-Enhance ---
-        lab = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB)
-        l, a, b = cv2.split(lab)
-        clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8,8))
-        cl = clahe.apply(l)
-        enhanced_frame = cv2.merge((cl,a,b))
-        enhanced_frame = cv2.cvtColor(enhanced_frame, cv2.COLOR_LAB2BGR)
-
-        # Extraction with Fallback
-        try:
-            res = DeepFace.represent(enhanced_frame, model_name='Facenet', detector_backend='opencv', enforce_detection=True)
-        except:
-            res = DeepFace.represent(enhanced_frame, model_name='Facenet', detector_backend='retinaface', enforce_detection=True)
-            
-        live_emb = np.array(res[0]['embedding'])
-        box = res[0]['facial_area']
+        # Auto-enhance + Facenet, opencv detector with RetinaFace fallback
+        live_emb, box = face_session.embed(frame)
         
         if not embedding_cache:
             load_cache()
@@ -334,21 +438,11 @@ def mark_attendance():
             core.set_ui_status("No Records", (0, 0, 255), "Unknown")
             return jsonify({"status":"error", "msg":"Biometric database is empty."})
 
-        best_match = None
-        best_dist = 0.48 # Relaxed Threshold (Friendly Mode)
-
-        # ULTRA FAST Vector Search
-        for face in embedding_cache:
-            a = live_emb; b = face['embedding']
-            dist = 1 - np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
-            
-            if dist < best_dist:
-                best_match = face
-                best_dist = dist
+        # ULTRA FAST Vector Search (one matrix-vector product + argmin)
+        best_match = embedding_cache.match(live_emb, MATCH_THRESHOLD)
 
         if best_match:
-            user_id = best_match['user_id']
-            full_name = best_match['full_name']
+            user_id, full_name, best_dist = best_match
             
             db = get_db(); c = db.cursor(dictionary=True)
             now = datetime.datetime.now(); today = now.strftime("%Y-%m-%d"); current_time = now.strftime("%H:%M:%S")
@@ -381,6 +475,9 @@ def mark_attendance():
         return jsonify({"status":"error", "msg":f"Detection failed: {str(e)}"})
 
 if __name__ == '__main__':
-    load_cache()
+    # Model loads in the background so the camera feed is up immediately; /health reports readiness
+    threading.Thread(target=initialize, daemon=True).start()
+    boot_cache()
+    threading.Thread(target=reconcile_loop, daemon=True).start()
     print("\n[BOOT] BIOMETRIC CORE v4.2")
     app.run(host='127.0.0.1', port=5005, debug=False, threaded=True)
@@ -0,0 +1,138 @@
+import os
+import json
+import shutil
+import tempfile
+import time
+import numpy as np
+from gallery import FaceGallery, normalize_rows
+from index import make_index, has_hnswlib, INDEX_DIR
+from embedding_store import encode_embedding, decode_rows, save_snapshot, load_snapshot
+
+# Face search cost by gallery size:
+# 1. the old per-face Python loop (np.dot + two norms per enrolled face) vs the normalized float32 matrix
+# 2. every index backend: build time, per-query latency and recall@1 against exact search
+# 3. warm-up at WARMUP_FACES with the boot-time index: JSON rows vs packed binary rows vs the
+#    memory-mapped snapshot (index rebuilt / loaded from disk)
+# Run from this directory: python benchmark.py
+GALLERY_SIZES = [10_000, 100_000]
+DIM = 128 # Facenet embedding size
+QUERIES = 50
+LOOP_QUERIES = 3 # the loop is slow at 100k, a few queries are enough
+MATCH_THRESHOLD = 0.48
+RECALL_QUERIES = 1000
+BACKENDS = ['brute', 'ivf'] + (['hnsw'] if has_hnswlib() else [])
+WARMUP_FACES = 50_000
+
+
+def loop_search(cache, live_emb, threshold):
+    best_match, best_dist = None, threshold
+    for face in cache:
+        a = live_emb; b = face['embedding']
+        dist = 1 - np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
+        if dist < best_dist:
+            best_match, best_dist = face, dist
+    return best_match
+
+
+def per_query_ms(fn, queries):
+    start = time.perf_counter()
+    for query in queries:
+        fn(query)
+    return (time.perf_counter() - start) * 1000 / len(queries)
+
+
+rng = np.random.default_rng(0)
+print(f"{'Faces':>8}{'loop (ms)':>12}{'matrix (ms)':>13}{'speedup':>10}{'build (ms)':>12}{'matrix MB':>11}")
+for size in GALLERY_SIZES:
+    embeddings = rng.normal(size=(size, DIM))
+    # Queries are noisy copies of enrolled faces, so every query has a true match
+    targets = rng.integers(0, size, QUERIES)
+    queries = embeddings[targets] + rng.normal(scale=0.1, size=(QUERIES, DIM))
+
+    cache = [{"user_id": i, "full_name": f"User {i}", "embedding": e} for i, e in enumerate(embeddings)]
+    start = time.perf_counter()
+    gallery = FaceGallery(range(size), [f"User {i}" for i in range(size)], embeddings, index_kind='brute')
+    build_ms = (time.perf_counter() - start) * 1000
+
+    # Same decisions as the loop
+    for query, target in zip(queries[:LOOP_QUERIES], targets):
+        expected = loop_search(cache, query, MATCH_THRESHOLD)
+        found = gallery.match(query, MATCH_THRESHOLD)
+        assert (expected is None) == (found is None) and (found is None or found[0] == expected['user_id'])
+
+    loop_ms = per_query_ms(lambda q: loop_search(cache, q, MATCH_THRESHOLD), queries[:LOOP_QUERIES])
+    matrix_ms = per_query_ms(lambda q: gallery.match(q, MATCH_THRESHOLD), queries)
+    print(f"{size:>8}{loop_ms:>12.2f}{matrix_ms:>13.3f}{loop_ms / matrix_ms:>9.0f}x{build_ms:>12.1f}{gallery.matrix.nbytes / 1e6:>11.1f}")
+
+print()
+print(f"{'Faces':>8}{'index':>8}{'build (s)':>11}{'p50 (ms)':>10}{'p99 (ms)':>10}{'recall@1':>10}")
+for size in GALLERY_SIZES:
+    # Clustered embeddings (several photos per identity look alike), like real galleries
+    centers = rng.normal(size=(size // 10, DIM))
+    matrix = normalize_rows((centers[rng.integers(0, len(centers), size)] + rng.normal(scale=0.5, size=(size, DIM))).astype(np.float32))
+    queries = normalize_rows((matrix[rng.integers(0, size, RECALL_QUERIES)] + rng.normal(scale=0.05, size=(RECALL_QUERIES, DIM))).astype(np.float32))
+    exact = np.argmax(queries @ matrix.T, axis=1)
+
+    for kind in BACKENDS:
+        index = make_index(size, kind)
+        start = time.perf_counter()
+        index.build(matrix)
+        build_s = time.perf_counter() - start
+
+        timings, found = [], []
+        for query in queries:
+            start = time.perf_counter()
+            rows = index.search(matrix, query, k=1)
+            timings.append((time.perf_counter() - start) * 1000)
+            found.append(rows[0] if len(rows) else -1)
+        recall = float(np.mean(np.array(found) == exact))
+        print(f"{size:>8}{kind:>8}{build_s:>11.2f}{np.percentile(timings, 50):>10.3f}{np.percentile(timings, 99):>10.3f}{recall:>10.3f}")
+
+print()
+print(f"{'Faces':>8}{'source':>22}{'index':>7}{'warm-up (ms)':>14}{'stored MB':>11}")
+embeddings = rng.normal(size=(WARMUP_FACES, DIM)).astype(np.float32)
+names = [f"User {i}" for i in range(WARMUP_FACES)]
+ids = np.arange(1, WARMUP_FACES + 1)
+# Rows as mysql.connector returns them; the database round trip itself is not timed
+json_rows = [{"embedding": json.dumps(e.tolist())} for e in embeddings]
+bin_rows = [{"embedding_bin": encode_embedding(e)} for e in embeddings]
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+def from_snapshot():
+    snapshot = load_snapshot()
+    return FaceGallery(snapshot["user_ids"], snapshot["names"], snapshot["matrix"], face_ids=snapshot["face_ids"], normalized=True)
+
+def report(source, gallery, warmup_ms, stored_mb):
+    print(f"{WARMUP_FACES:>8}{source:>22}{gallery.index.kind:>7}{warmup_ms:>14.1f}{stored_mb:>11.1f}")
+
+# Boot builds the same index it would in app.py (FACE_INDEX, default auto: hnsw / ivf at this size).
+# Runs in a scratch directory so face_index/ and face_snapshot/ start empty.
+cwd = os.getcwd()
+with tempfile.TemporaryDirectory() as scratch:
+    os.chdir(scratch)
+    try:
+        gallery, json_ms = timed(lambda: FaceGallery(ids, names, np.array([json.loads(r['embedding']) for r in json_rows]), face_ids=ids))
+        report("json", gallery, json_ms, sum(len(r['embedding']) for r in json_rows) / 1e6)
+        shutil.rmtree(INDEX_DIR, ignore_errors=True)
+        gallery, bin_ms = timed(lambda: FaceGallery(ids, names, decode_rows(bin_rows), face_ids=ids))
+        report("binary", gallery, bin_ms, sum(len(r['embedding_bin']) for r in bin_rows) / 1e6)
+
+        save_snapshot(*gallery.snapshot()[1:])
+        shutil.rmtree(INDEX_DIR, ignore_errors=True)
+        gallery, cold_ms = timed(from_snapshot)
+        report("snapshot, index built", gallery, cold_ms, gallery.matrix.nbytes / 1e6)
+        gallery, warm_ms = timed(from_snapshot)
+        report("snapshot, index saved", gallery, warm_ms, gallery.matrix.nbytes / 1e6)
+
+        # Tombstones are part of the snapshot, so the index persisted with it is still reused
+        gallery.remove(face_ids=ids[::100])
+        save_snapshot(*gallery.snapshot()[1:])
+        gallery.persist_index()
+        gallery, tomb_ms = timed(from_snapshot)
+        report("snapshot + tombstones", gallery, tomb_ms, gallery.matrix.nbytes / 1e6)
+    finally:
+        os.chdir(cwd)
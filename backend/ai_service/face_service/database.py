@@ -0,0 +1,5 @@
+import mysql.connector
+
+# --- Database ---
+def get_db():
+    return mysql.connector.connect(host="localhost", user="root", password="", database="medisphere_shms")
@@ -0,0 +1,111 @@
+import os
+import json
+import time
+import numpy as np
+
+# Embedding storage formats.
+# ai_faces.embedding_bin holds each vector as packed little-endian float32
+# (or float16, FACE_EMBEDDING_DTYPE) bytes instead of a JSON text list; the
+# legacy JSON column is still read for rows the migration has not reached.
+# The gallery snapshot is a set of .npy files (memory-mapped on boot) plus a
+# small meta.json naming the current files, so the service can start without
+# touching MySQL and catch up through reconciliation afterwards. It keeps
+# tombstoned rows (user_id -1) so the index persisted with it still matches.
+
+EMBEDDING_DIM = 128 # Facenet
+STORE_DTYPE = np.dtype('<f2' if os.environ.get('FACE_EMBEDDING_DTYPE') == 'float16' else '<f4')
+SNAPSHOT_DIR = os.environ.get('FACE_SNAPSHOT_DIR', 'face_snapshot')
+
+_columns = None
+
+
+def encode_embedding(embedding):
+    return np.asarray(embedding, dtype=STORE_DTYPE).tobytes()
+
+
+def decode_embedding(blob):
+    # The byte length tells float16 from float32, so both can coexist in one table
+    dtype = '<f2' if len(blob) == 2 * EMBEDDING_DIM else '<f4'
+    return np.frombuffer(blob, dtype=dtype).astype(np.float32)
+
+
+UNKNOWN_COLUMN = 1054 # MySQL error: the cached columns are out of date (e.g. JSON column dropped)
+
+
+def face_columns(cursor):
+    # Embedding columns present in ai_faces; probed again until embedding_bin shows up, and after
+    # forget_columns(), so a migration run while the service is up is picked up without a restart
+    global _columns
+    if _columns is None or 'embedding_bin' not in _columns:
+        cursor.execute("SHOW COLUMNS FROM ai_faces")
+        names = {row['Field'] if isinstance(row, dict) else row[0] for row in cursor.fetchall()}
+        _columns = [column for column in ('embedding_bin', 'embedding') if column in names]
+    return _columns
+
+
+def forget_columns():
+    global _columns
+    _columns = None
+
+
+def row_embedding(row):
+    # Either column may be absent from the row (before / after the migration)
+    if row.get('embedding_bin') is not None:
+        return decode_embedding(bytes(row['embedding_bin']))
+    if row.get('embedding') is None:
+        raise ValueError(f"face_id {row.get('face_id')} has no stored embedding")
+    return np.asarray(json.loads(row['embedding']), dtype=np.float32)
+
+
+def decode_rows(rows):
+    # (n, dim) float32; a single frombuffer over the joined blobs when every row is binary and same-width
+    if not rows:
+        return np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+    blobs = [row.get('embedding_bin') for row in rows]
+    if all(blob is not None for blob in blobs) and len({len(blob) for blob in blobs}) == 1:
+        dtype = '<f2' if len(blobs[0]) == 2 * EMBEDDING_DIM else '<f4'
+        return np.frombuffer(b''.join(bytes(blob) for blob in blobs), dtype=dtype).reshape(len(rows), -1).astype(np.float32)
+    return np.stack([row_embedding(row) for row in rows])
+
+
+def save_snapshot(matrix, face_ids, user_ids, names, snapshot_dir=SNAPSHOT_DIR):
+    # New files under a fresh name, then meta.json is replaced atomically, then old files go
+    os.makedirs(snapshot_dir, exist_ok=True)
+    watermark = int(face_ids.max()) if len(face_ids) else 0
+    tag = f"{watermark}_{len(face_ids)}_{time.time_ns()}" # never reuses the files meta.json points at
+    files = {"matrix": f"matrix_{tag}.npy", "ids": f"ids_{tag}.npy", "names": f"names_{tag}.json"}
+    np.save(os.path.join(snapshot_dir, files["matrix"]), np.ascontiguousarray(matrix, dtype=np.float32))
+    np.save(os.path.join(snapshot_dir, files["ids"]), np.column_stack([face_ids, user_ids]).astype(np.int64))
+    with open(os.path.join(snapshot_dir, files["names"]), 'w') as f:
+        json.dump(list(names), f)
+
+    meta_path = os.path.join(snapshot_dir, 'meta.json')
+    tmp_path = f"{meta_path}.tmp{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        json.dump({"files": files, "count": len(face_ids), "watermark": watermark, "normalized": True}, f)
+    os.replace(tmp_path, meta_path)
+
+    keep = set(files.values()) | {'meta.json'}
+    for name in os.listdir(snapshot_dir):
+        if name not in keep and not name.startswith('meta.json'):
+            try:
+                os.remove(os.path.join(snapshot_dir, name))
+            except OSError:
+                pass
+
+
+def load_snapshot(snapshot_dir=SNAPSHOT_DIR):
+    # -> dict(matrix (memory-mapped), face_ids, user_ids, names, watermark) or None
+    meta_path = os.path.join(snapshot_dir, 'meta.json')
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    files = meta["files"]
+    matrix = np.load(os.path.join(snapshot_dir, files["matrix"]), mmap_mode='r')
+    ids = np.load(os.path.join(snapshot_dir, files["ids"]))
+    with open(os.path.join(snapshot_dir, files["names"])) as f:
+        names = json.load(f)
+    if not (len(matrix) == len(ids) == len(names) == meta["count"]):
+        raise ValueError("Gallery snapshot files do not match")
+    return {"matrix": matrix, "face_ids": ids[:, 0], "user_ids": ids[:, 1], "names": names, "watermark": meta["watermark"]}
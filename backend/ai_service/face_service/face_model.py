@@ -0,0 +1,107 @@
+import time
+import threading
+from collections import deque
+import cv2
+import numpy as np
+
+# Facenet and the face detectors, held for the life of the process.
+# DeepFace builds models lazily on the first represent() call (seconds for
+# Facenet, more for RetinaFace) and caches them afterwards, so the session
+# imports DeepFace once, builds the recognition model and runs every detector
+# over a synthetic frame at boot. Requests then only pay for inference.
+# Cold (first pass), warm (steady-state) and live request latencies are kept
+# for /health.
+
+MODEL_NAME = 'Facenet'
+DETECTORS = ['opencv', 'retinaface'] # Fast detector first, RetinaFace as the fallback
+WARMUP_RUNS = 3 # steady-state passes after the cold one
+LATENCY_WINDOW = 200 # live requests kept for percentiles
+
+
+def enhance(frame):
+    # Convert to LAB to normalize brightness (CLAHE on the L channel)
+    lab = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB)
+    l, a, b = cv2.split(lab)
+    clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8,8))
+    cl = clahe.apply(l)
+    return cv2.cvtColor(cv2.merge((cl,a,b)), cv2.COLOR_LAB2BGR)
+
+
+def ms(seconds):
+    return round(seconds * 1000, 1)
+
+
+class FaceSession:
+
+    def __init__(self, model_name=MODEL_NAME, detectors=DETECTORS):
+        self.model_name = model_name
+        self.detectors = list(detectors)
+        self.deepface = None
+        self.model = None
+        self.stats = {}
+        self.first_request_ms = None
+        self.requests = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.lock = threading.Lock()
+
+    def load(self):
+        # Import DeepFace (TensorFlow) and build Facenet once -> seconds taken
+        start = time.perf_counter()
+        from deepface import DeepFace
+        self.deepface = DeepFace
+        self.model = DeepFace.build_model(self.model_name)
+        elapsed = time.perf_counter() - start
+        self.stats["load_ms"] = ms(elapsed)
+        return elapsed
+
+    def represent(self, frame, detector, enforce_detection=True):
+        return self.deepface.represent(frame, model_name=self.model_name, detector_backend=detector, enforce_detection=enforce_detection)
+
+    def warm_up(self, runs=WARMUP_RUNS):
+        # First pass per detector builds it (cold); the next passes are the steady state
+        frame = np.random.default_rng(0).integers(0, 256, (480, 640, 3), dtype=np.uint8)
+        start = time.perf_counter()
+        cold, warm = {}, {}
+        for detector in self.detectors:
+            began = time.perf_counter()
+            self.represent(frame, detector, enforce_detection=False)
+            cold[detector] = ms(time.perf_counter() - began)
+            timings = []
+            for _ in range(runs):
+                began = time.perf_counter()
+                self.represent(frame, detector, enforce_detection=False)
+                timings.append(time.perf_counter() - began)
+            warm[detector] = ms(float(np.median(timings)))
+        self.stats.update(cold_ms=cold, warm_ms=warm)
+        return time.perf_counter() - start
+
+    def embed(self, frame):
+        # -> (embedding, facial_area) of the first face found, trying the detectors in order
+        start = time.perf_counter()
+        enhanced_frame = enhance(frame)
+        for i, detector in enumerate(self.detectors):
+            try:
+                res = self.represent(enhanced_frame, detector)
+                break
+            except Exception as e:
+                if i == len(self.detectors) - 1:
+                    raise
+                print(f"[RETRY] {detector} failed, trying {self.detectors[i + 1]}: {e}")
+        self.record(time.perf_counter() - start)
+        return np.array(res[0]['embedding']), res[0]['facial_area'] # x, y, w, h
+
+    def record(self, seconds):
+        with self.lock:
+            if self.first_request_ms is None:
+                self.first_request_ms = ms(seconds)
+            self.requests += 1
+            self.latencies.append(seconds)
+
+    def latency(self):
+        # Boot timings plus first / steady-state request latency
+        with self.lock:
+            timings = np.array(self.latencies) if self.latencies else None
+            report = dict(self.stats, first_request_ms=self.first_request_ms, requests=self.requests)
+        if timings is not None:
+            report.update(p50_ms=ms(float(np.percentile(timings, 50))), p95_ms=ms(float(np.percentile(timings, 95))))
+        return report
@@ -0,0 +1,176 @@
+import hashlib
+import threading
+import numpy as np
+from index import load_or_build, resolve_kind, save as save_index, INDEX_KIND
+
+# Enrolled face embeddings as one contiguous float32 matrix.
+# Rows are L2-normalized once when a face enters the gallery, so the cosine
+# distance to every enrolled face is a single matrix-vector product:
+#     dist = 1 - (E @ q) / ||q||
+# face_ids / user_ids / names are parallel arrays indexed by row. Candidate
+# rows come from a pluggable nearest-neighbour index (index.py); distances for
+# those rows are always exact.
+#
+# Updates are in place and guarded by the gallery lock: registrations append
+# to a buffer with spare capacity, deletions zero the row and tombstone it
+# (user_id -1, distance 1.0, removed from the index). Tombstones are compacted
+# by the next full load. Only the in-memory index changes under the lock; it
+# is written to disk by persist_index(), from the background snapshot path.
+
+TOMBSTONE = -1
+
+
+def normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.maximum(norms, 1e-12, out=norms)
+    matrix /= norms
+    return matrix
+
+
+class FaceGallery:
+
+    def __init__(self, user_ids, names, embeddings, face_ids=None, index_kind=None, normalized=False):
+        # embeddings may be a read-only memory map (snapshot); it is copied once into the buffer
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        self.dim = embeddings.shape[1]
+        self.size = len(embeddings)
+        self.buffer = np.empty((max(16, 2 * self.size), self.dim), dtype=np.float32)
+        self.buffer[:self.size] = embeddings
+        if not normalized:
+            normalize_rows(self.matrix)
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.face_ids = np.asarray(face_ids if face_ids is not None else np.arange(1, self.size + 1), dtype=np.int64)
+        self.names = list(names)
+        # Snapshots keep tombstoned rows, so row numbers (and the persisted index) stay valid
+        removed = np.flatnonzero(self.user_ids == TOMBSTONE)
+        self.deleted = len(removed)
+        self.version = 0 # bumped by every add/remove, so the snapshot writer knows when it is behind
+        self.lock = threading.Lock()
+        self.index_kind = index_kind or INDEX_KIND # configured kind; 'auto' may outgrow its first choice
+        self.index = load_or_build(self.matrix, self.fingerprint(), kind=self.index_kind, removed=removed)
+
+    @classmethod
+    def empty(cls, dim=128):
+        gallery = cls([], [], np.zeros((0, dim), dtype=np.float32), index_kind='brute')
+        gallery.index_kind = INDEX_KIND # grows into the configured index (see upgrade_index)
+        return gallery
+
+    @property
+    def matrix(self):
+        return self.buffer[:self.size]
+
+    def __len__(self):
+        # Enrolled (live) faces
+        return self.size - self.deleted
+
+    def tombstone_ratio(self):
+        return self.deleted / self.size if self.size else 0.0
+
+    def fingerprint(self):
+        # Identifies the rows (and which are tombstoned) a persisted index was built for
+        return hashlib.sha1(self.face_ids.tobytes() + (self.user_ids == TOMBSTONE).tobytes()).hexdigest()
+
+    def snapshot(self):
+        # Every row, tombstones included -> (version, matrix, face_ids, user_ids, names), for the
+        # on-disk snapshot. Like persist_index(), runs outside the gallery lock with writers held off
+        return self.version, self.matrix.copy(), self.face_ids.copy(), self.user_ids.copy(), list(self.names)
+
+    def live_face_ids(self):
+        with self.lock:
+            return self.face_ids[self.user_ids != TOMBSTONE].copy()
+
+    def add(self, face_id, user_id, name, embedding):
+        # Append one registered face and insert it into the index
+        return self.add_many([face_id], [user_id], [name], [embedding]) == 1
+
+    def add_many(self, face_ids, user_ids, names, embeddings):
+        # Append a batch of faces in one locked update (one index insert) -> number added
+        rows = normalize_rows(np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim))
+        face_ids = np.asarray(face_ids, dtype=np.int64)
+        with self.lock:
+            new = ~np.isin(face_ids, self.face_ids)
+            count = int(new.sum())
+            if not count:
+                return 0
+            if self.size + count > len(self.buffer):
+                grown = np.empty((max(2 * len(self.buffer), self.size + count), self.dim), dtype=np.float32)
+                grown[:self.size] = self.matrix
+                self.buffer = grown
+            start = self.size
+            self.buffer[start:start + count] = rows[new]
+            # Parallel arrays are replaced, not resized, so a row read before the lock stays valid
+            self.user_ids = np.concatenate([self.user_ids, np.asarray(user_ids, dtype=np.int64)[new]])
+            self.face_ids = np.concatenate([self.face_ids, face_ids[new]])
+            self.names = self.names + [name for name, keep in zip(names, new) if keep]
+            self.size += count
+            self.version += 1
+            self.index.add(self.matrix, start)
+            return count
+
+    def remove(self, face_ids=None, user_id=None):
+        # Tombstone faces by face_id and/or every face of a user -> number removed
+        with self.lock:
+            live = self.user_ids != TOMBSTONE
+            hit = np.zeros(self.size, dtype=bool)
+            if face_ids is not None:
+                hit |= np.isin(self.face_ids, np.asarray(list(face_ids), dtype=np.int64))
+            if user_id is not None:
+                hit |= self.user_ids == int(user_id)
+            rows = np.flatnonzero(hit & live)
+            if not len(rows):
+                return 0
+            user_ids = self.user_ids.copy()
+            user_ids[rows] = TOMBSTONE
+            self.user_ids = user_ids
+            self.buffer[rows] = 0.0 # cosine distance 1.0: can never pass a threshold
+            self.deleted += len(rows)
+            self.version += 1
+            self.index.remove(rows)
+            return len(rows)
+
+    def upgrade_index(self):
+        # Switch backends once the gallery has grown past what its index was chosen for (e.g.
+        # brute -> hnsw at AUTO_MIN_FACES). Built outside the gallery lock, swapped in under it;
+        # like persist_index(), the caller keeps add/remove out meanwhile -> True when switched
+        kind = resolve_kind(self.size, self.index_kind) # rows, as at construction
+        if kind == self.index.kind:
+            return False
+        index = load_or_build(self.matrix, self.fingerprint(), kind=kind, removed=np.flatnonzero(self.user_ids == TOMBSTONE))
+        with self.lock:
+            self.index = index
+        print(f"[INDEX] Gallery of {self.size} rows moved to the {kind} index")
+        return True
+
+    def persist_index(self):
+        # Write the index for the current rows to disk. Not under the gallery lock, so
+        # searches keep running; the caller must keep add/remove out meanwhile (app.py cache_lock)
+        save_index(self.index, self.size, self.fingerprint())
+
+    def distances(self, embedding, rows=None):
+        # Cosine distance from one embedding to the given rows (default: every enrolled face)
+        query = np.asarray(embedding, dtype=np.float32)
+        matrix = self.matrix if rows is None else self.matrix[rows]
+        return 1.0 - (matrix @ query) / max(float(np.linalg.norm(query)), 1e-12)
+
+    def nearest(self, embedding):
+        # -> (row, distance, user_id, name) of the closest enrolled face, or None when empty
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        with self.lock:
+            if not len(self):
+                return None
+            rows = self.index.search(self.matrix, query, k=1)
+            if not len(rows):
+                return None
+            row = int(rows[0])
+            if self.user_ids[row] == TOMBSTONE:
+                return None
+            return row, float(self.distances(query, [row])[0]), int(self.user_ids[row]), self.names[row]
+
+    def match(self, embedding, threshold):
+        # -> (user_id, full_name, distance) when the closest face is under threshold, else None
+        found = self.nearest(embedding)
+        if found is None or found[1] >= threshold:
+            return None
+        _, dist, user_id, name = found
+        return user_id, name, dist
@@ -0,0 +1,269 @@
+import os
+import json
+import numpy as np
+
+# Nearest-neighbour backends over the gallery's normalized embedding matrix.
+# All of them answer search(query, k) -> row indices of the k most similar
+# faces (inner product == cosine similarity on unit vectors); the gallery
+# then computes exact distances for those rows, so thresholds are unchanged.
+#
+#   brute  exact scan, one matrix-vector product (default for small galleries)
+#   ivf    inverted file: spherical k-means cells, probe the closest cells only (pure NumPy)
+#   hnsw   hnswlib graph, when the optional package is installed
+#
+# FACE_INDEX picks one; 'auto' uses brute below AUTO_MIN_FACES, else hnsw or ivf.
+
+INDEX_KIND = os.environ.get('FACE_INDEX', 'auto')
+INDEX_DIR = os.environ.get('FACE_INDEX_DIR', 'face_index')
+AUTO_MIN_FACES = 20_000
+IVF_NPROBE = int(os.environ.get('FACE_IVF_NPROBE', 8))
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = int(os.environ.get('FACE_HNSW_EF', 64))
+CHUNK = 8192 # rows per block when assigning to centroids
+
+
+class BruteForceIndex:
+    kind = 'brute'
+
+    # Scans the gallery's matrix directly, so there is nothing to build or store
+    def build(self, matrix):
+        pass
+
+    def add(self, matrix, start):
+        pass
+
+    def remove(self, rows):
+        pass # the gallery zeroes removed rows
+
+    def search(self, matrix, query, k=1):
+        sims = matrix @ query
+        if k >= len(sims):
+            return np.argsort(-sims)
+        top = np.argpartition(-sims, k)[:k]
+        return top[np.argsort(-sims[top])]
+
+    def save(self, path):
+        pass
+
+    def load(self, path, matrix):
+        return True
+
+
+class IVFIndex:
+    kind = 'ivf'
+
+    def __init__(self, nprobe=IVF_NPROBE, iterations=10, seed=0):
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids = None
+        self.lists = []
+
+    def _assign(self, matrix):
+        # Closest centroid per row, in blocks to bound the (rows x cells) product
+        assign = np.empty(len(matrix), dtype=np.int64)
+        for start in range(0, len(matrix), CHUNK):
+            assign[start:start + CHUNK] = np.argmax(matrix[start:start + CHUNK] @ self.centroids.T, axis=1)
+        return assign
+
+    def build(self, matrix):
+        n = len(matrix)
+        self.lists = []
+        if not n:
+            self.centroids = None # trained on the first insert
+            return
+        nlist = max(1, min(n, int(4 * np.sqrt(n))))
+        rng = np.random.default_rng(self.seed)
+        # Spherical k-means on a sample (about 64 points per cell)
+        sample = matrix[rng.choice(n, size=min(n, nlist * 64), replace=False)]
+        self.centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(self.iterations):
+            assign = self._assign(sample)
+            sums = np.zeros_like(self.centroids)
+            np.add.at(sums, assign, sample)
+            empty = ~sums.any(axis=1)
+            sums[empty] = self.centroids[empty]
+            self.centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+        self._fill(self._assign(matrix), 0)
+
+    def _fill(self, assign, start):
+        self._fill_rows(assign, np.arange(start, start + len(assign)))
+
+    def _fill_rows(self, assign, rows):
+        # Append rows[i] to cell assign[i]
+        if not self.lists:
+            self.lists = [np.empty(0, dtype=np.int64) for _ in range(len(self.centroids))]
+        order = np.argsort(assign, kind='stable')
+        cells, bounds = np.unique(assign[order], return_index=True)
+        for cell, members in zip(cells, np.split(rows[order], bounds[1:])):
+            self.lists[cell] = np.concatenate([self.lists[cell], members])
+
+    def add(self, matrix, start):
+        # New faces join their closest existing cell; cells are re-trained on the next full build
+        if self.centroids is None:
+            self.build(matrix)
+            return
+        self._fill(self._assign(matrix[start:]), start)
+
+    def remove(self, rows):
+        self.lists = [cell[~np.isin(cell, rows)] for cell in self.lists]
+
+    def search(self, matrix, query, k=1):
+        if self.centroids is None:
+            return np.empty(0, dtype=np.int64)
+        cell_sims = self.centroids @ query
+        nprobe = min(self.nprobe, len(cell_sims))
+        cells = np.argpartition(-cell_sims, nprobe - 1)[:nprobe]
+        candidates = np.concatenate([self.lists[c] for c in cells])
+        if not len(candidates):
+            return candidates
+        sims = matrix[candidates] @ query
+        top = np.argsort(-sims)[:k]
+        return candidates[top]
+
+    def save(self, path):
+        if self.centroids is None:
+            return
+        np.savez(path + '.npz', centroids=self.centroids, assign=self._assignments())
+
+    def _assignments(self):
+        # Cell per row; -1 for removed rows
+        assign = np.full(max((int(rows.max()) + 1 for rows in self.lists if len(rows)), default=0), -1, dtype=np.int64)
+        for cell, rows in enumerate(self.lists):
+            assign[rows] = cell
+        return assign
+
+    def load(self, path, matrix):
+        if not os.path.exists(path + '.npz'):
+            return False
+        data = np.load(path + '.npz')
+        assign = data['assign']
+        if len(assign) > len(matrix):
+            return False
+        self.centroids = data['centroids']
+        self.lists = []
+        rows = np.flatnonzero(assign >= 0)
+        self._fill_rows(assign[rows], rows)
+        return True
+
+
+class HNSWIndex:
+    kind = 'hnsw'
+
+    def __init__(self, m=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION, ef_search=HNSW_EF_SEARCH):
+        import hnswlib
+        self.hnswlib = hnswlib
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.index = None
+
+    def _new(self, dim, capacity):
+        self.index = self.hnswlib.Index(space='ip', dim=dim)
+        self.index.init_index(max_elements=max(capacity, 1), M=self.m, ef_construction=self.ef_construction)
+        self.index.set_ef(self.ef_search)
+
+    def build(self, matrix):
+        self._new(matrix.shape[1], 2 * len(matrix))
+        if len(matrix):
+            self.index.add_items(matrix, np.arange(len(matrix)))
+
+    def add(self, matrix, start):
+        needed = len(matrix)
+        if needed > self.index.get_max_elements():
+            self.index.resize_index(2 * needed)
+        self.index.add_items(matrix[start:], np.arange(start, needed))
+
+    def remove(self, rows):
+        for row in rows:
+            self.index.mark_deleted(int(row))
+
+    def search(self, matrix, query, k=1):
+        k = min(k, self.index.get_current_count())
+        if not k:
+            return np.empty(0, dtype=np.int64)
+        labels, _ = self.index.knn_query(query, k=k)
+        return labels[0].astype(np.int64)
+
+    def save(self, path):
+        self.index.save_index(path + '.bin')
+
+    def load(self, path, matrix):
+        if not os.path.exists(path + '.bin'):
+            return False
+        self.index = self.hnswlib.Index(space='ip', dim=matrix.shape[1])
+        self.index.load_index(path + '.bin', max_elements=max(2 * len(matrix), 1))
+        if self.index.get_current_count() != len(matrix):
+            return False
+        self.index.set_ef(self.ef_search)
+        return True
+
+
+def has_hnswlib():
+    try:
+        import hnswlib # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def resolve_kind(size, kind=INDEX_KIND):
+    # Concrete backend for a gallery of this size
+    if kind == 'auto':
+        return 'brute' if size < AUTO_MIN_FACES else 'hnsw' if has_hnswlib() else 'ivf'
+    if kind == 'hnsw' and not has_hnswlib():
+        return 'ivf'
+    return kind
+
+
+def make_index(size, kind=INDEX_KIND):
+    if kind == 'hnsw' and not has_hnswlib():
+        print("[INDEX] hnswlib not installed, using the NumPy IVF index")
+    kind = resolve_kind(size, kind)
+    if kind == 'brute':
+        return BruteForceIndex()
+    if kind == 'ivf':
+        return IVFIndex()
+    if kind == 'hnsw':
+        return HNSWIndex()
+    raise ValueError(f"Unknown face index '{kind}' (choose from brute, ivf, hnsw, auto)")
+
+
+def index_path(kind, index_dir=INDEX_DIR):
+    return os.path.join(index_dir, f"gallery_{kind}")
+
+
+def load_or_build(matrix, fingerprint, kind=INDEX_KIND, index_dir=INDEX_DIR, removed=None):
+    # Reuse the index saved for this exact gallery, otherwise build and save it
+    # (removed: tombstoned rows, already absent from a saved index)
+    index = make_index(len(matrix), kind)
+    path = index_path(index.kind, index_dir)
+    meta_path = path + '.json'
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get("fingerprint") == fingerprint and index.load(path, matrix):
+            print(f"[INDEX] Loaded {index.kind} index for {len(matrix)} faces")
+            return index
+    except Exception:
+        pass # missing, stale or unreadable: rebuilt below
+
+    index.build(matrix)
+    if removed is not None and len(removed):
+        index.remove(removed)
+    save(index, len(matrix), fingerprint, index_dir)
+    return index
+
+
+def save(index, count, fingerprint, index_dir=INDEX_DIR):
+    if index.kind == 'brute':
+        return
+    path = index_path(index.kind, index_dir)
+    try:
+        os.makedirs(index_dir, exist_ok=True)
+        index.save(path)
+        with open(path + '.json', 'w') as f:
+            json.dump({"kind": index.kind, "count": count, "fingerprint": fingerprint}, f)
+    except OSError as e:
+        print(f"[INDEX ERROR] Could not persist index: {e}")
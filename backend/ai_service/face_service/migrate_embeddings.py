@@ -0,0 +1,93 @@
+import argparse
+import json
+import numpy as np
+from database import get_db
+from embedding_store import encode_embedding, decode_rows, save_snapshot, STORE_DTYPE, SNAPSHOT_DIR
+from gallery import normalize_rows
+
+# One-off migration of ai_faces from JSON text embeddings to packed binary:
+# 1. add the embedding_bin BLOB column (and make the JSON column nullable)
+# 2. backfill embedding_bin in chunks, resumable (only rows still NULL are read)
+# 3. optionally drop the JSON column and write the gallery snapshot
+# The face service reads either column, so it can keep running throughout.
+# Run from this directory: python migrate_embeddings.py [--drop-json] [--snapshot]
+CHUNK = 1000
+
+
+def columns(c):
+    # column -> nullable
+    c.execute("SHOW COLUMNS FROM ai_faces")
+    return {row[0]: row[2] == 'YES' for row in c.fetchall()}
+
+
+def migrate(drop_json=False):
+    db = get_db(); c = db.cursor()
+    present = columns(c)
+    if 'embedding_bin' not in present:
+        c.execute("ALTER TABLE ai_faces ADD COLUMN embedding_bin BLOB NULL AFTER embedding")
+        print("[MIGRATE] Added ai_faces.embedding_bin")
+    if 'embedding' in present:
+        if not present['embedding']:
+            # Same declaration as database.sql, so new binary-only rows can leave it NULL
+            c.execute("ALTER TABLE ai_faces MODIFY embedding JSON NULL")
+            print("[MIGRATE] ai_faces.embedding is now nullable")
+
+        done, skipped, last_id = 0, [], 0
+        while True:
+            # Keyset pages, so rows that fail to parse are not fetched again
+            c.execute("SELECT face_id, embedding FROM ai_faces WHERE face_id > %s AND embedding_bin IS NULL "
+                      "AND embedding IS NOT NULL ORDER BY face_id LIMIT %s", (last_id, CHUNK))
+            rows = c.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            packed = []
+            for face_id, emb in rows:
+                try:
+                    packed.append((encode_embedding(json.loads(emb)), face_id))
+                except (TypeError, ValueError) as e:
+                    print(f"[MIGRATE] Skipping face_id {face_id}: unreadable embedding ({e})")
+                    skipped.append(face_id)
+            c.executemany("UPDATE ai_faces SET embedding_bin = %s WHERE face_id = %s", packed)
+            db.commit()
+            done += len(packed)
+            print(f"[MIGRATE] {done} embeddings packed as {STORE_DTYPE.name}")
+        if skipped:
+            print(f"[MIGRATE] {len(skipped)} rows skipped: {skipped}")
+
+        if drop_json:
+            c.execute("SELECT COUNT(*) FROM ai_faces WHERE embedding_bin IS NULL")
+            if c.fetchone()[0]:
+                print("[MIGRATE] Rows without embedding_bin remain, keeping the JSON column")
+            else:
+                c.execute("ALTER TABLE ai_faces DROP COLUMN embedding")
+                print("[MIGRATE] Dropped ai_faces.embedding")
+    db.commit()
+    db.close()
+
+
+def snapshot(snapshot_dir=SNAPSHOT_DIR):
+    # Same rows and order as the service's full load
+    db = get_db(); c = db.cursor(dictionary=True)
+    c.execute("SELECT f.face_id, f.user_id, f.embedding_bin, u.first_name, u.last_name FROM ai_faces f "
+              "JOIN Users u ON f.user_id = u.user_id WHERE f.embedding_bin IS NOT NULL ORDER BY f.face_id")
+    rows = c.fetchall()
+    db.close()
+    save_snapshot(
+        normalize_rows(decode_rows(rows)),
+        np.array([r['face_id'] for r in rows], dtype=np.int64),
+        np.array([r['user_id'] for r in rows], dtype=np.int64),
+        [f"{r['first_name']} {r['last_name']}" for r in rows],
+        snapshot_dir
+    )
+    print(f"[MIGRATE] Wrote gallery snapshot of {len(rows)} faces to {snapshot_dir}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Move ai_faces embeddings from JSON to packed binary")
+    parser.add_argument('--drop-json', action='store_true', help="drop the JSON column once every row is packed")
+    parser.add_argument('--snapshot', action='store_true', help="write the memory-mapped gallery snapshot afterwards")
+    args = parser.parse_args()
+    migrate(args.drop_json)
+    if args.snapshot:
+        snapshot()
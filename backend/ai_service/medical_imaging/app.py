@@ -2,21 +2,135 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 import os
 import time
-from model import load_model, predict_image
+import threading
+import numpy as np
+from model import load_serving_model, warm_up, predict_batch, rank_scores, weights_version, LABELS
+from report import generate_report, structured_report
+from decoding import decode_study
+from batcher import MicroBatcher
+from storage import content_hash, persist_upload, UPLOAD_FOLDER
+from result_cache import ResultCache
+from jobs import JobQueue
 
 app = Flask(__name__)
 CORS(app)
 
-UPLOAD_FOLDER = 'uploads'
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
-# Load AI Model on Startup
-print("Initializing AI Model...")
-model, device = load_model()
-print("AI Model Ready.")
+# Load AI Model on Startup (in the background; /health reports readiness)
+STARTED_AT = time.time()
+startup = {"ready": False, "error": None, "worker": int(os.environ.get('XRAY_WORKER_INDEX', 0)), "pid": os.getpid()}
+model_settled = threading.Event() # set once loading has succeeded or failed
+model, device = None, None
+result_cache = None # created by initialize(): keying it hashes the checkpoint
 
+class ModelNotReady(Exception):
+    pass
 
+class InvalidStudy(Exception):
+    pass
+
+def initialize():
+    global model, device, result_cache
+    try:
+        print("Initializing AI Model...")
+        start = time.perf_counter()
+        # Re-submitted studies (same bytes, same weights) skip DenseNet121 entirely
+        result_cache = ResultCache(weights_version())
+        startup["weights_version"] = result_cache.weights_version
+        model, device = load_serving_model()
+        startup["load_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        startup["warmup_ms"] = round(warm_up(model, device) * 1000, 1)
+        startup["startup_ms"] = round((time.time() - STARTED_AT) * 1000, 1)
+        startup["ready"] = True
+        print(f"AI Model Ready in {startup['startup_ms']:.0f} ms (load {startup['load_ms']:.0f} ms, warm-up {startup['warmup_ms']:.0f} ms).")
+    except Exception as e:
+        startup["error"] = str(e)
+        print(f"Model Initialization Error: {e}")
+    finally:
+        model_settled.set()
+
+threading.Thread(target=initialize, daemon=True).start()
+
+# Concurrent uploads share forward passes (up to XRAY_MAX_BATCH_SIZE images / XRAY_MAX_WAIT_MS)
+batcher = MicroBatcher(lambda tensors: predict_batch(model, device, tensors))
+INFERENCE_TIMEOUT = 120 # seconds
+
+# Preprocessing (decode -> tensor) is timed separately from the batched forward pass
+timing_lock = threading.Lock()
+timings = {"images": 0, "preprocess_seconds": 0.0, "inference_seconds": 0.0}
+
+def record_timing(preprocess_seconds, inference_seconds):
+    with timing_lock:
+        timings["images"] += 1
+        timings["preprocess_seconds"] += preprocess_seconds
+        timings["inference_seconds"] += inference_seconds
+
+def timing_stats():
+    with timing_lock:
+        images = timings["images"]
+        return {
+            "images": images,
+            "avg_preprocess_ms": round(timings["preprocess_seconds"] * 1000 / images, 2) if images else 0.0,
+            "avg_inference_ms": round(timings["inference_seconds"] * 1000 / images, 2) if images else 0.0,
+        }
+
+
+
+@app.route('/health', methods=['GET'])
+def health():
+    status = {"status": "ready" if startup["ready"] else "error" if startup["error"] else "loading", **startup}
+    if not startup["ready"]:
+        status["uptime_ms"] = round((time.time() - STARTED_AT) * 1000, 1)
+    return jsonify(status), 200 if startup["ready"] else 503
+
+def analyze_study(data, filename, wait_for_model=False):
+    # Shared by the synchronous endpoint and the job workers
+    digest = content_hash(data)
+    cached = result_cache.get(digest) if result_cache else None
+    if cached:
+        return {**cached, "image_hash": digest, "cached": True}
+
+    if wait_for_model:
+        model_settled.wait()
+    if not startup["ready"]:
+        raise ModelNotReady(startup["error"] or "Model is still loading")
+
+    # REAL INFERENCE (preprocess here, forward pass batched with other requests)
+    # DICOM / 16-bit TIFF studies may hold several frames; all go through the model together
+    start = time.perf_counter()
+    try:
+        frames = decode_study(data)
+    except Exception as e:
+        raise InvalidStudy(f"Could not read the uploaded image: {e}") from e
+    preprocessed = time.perf_counter()
+    # Only studies that decode are kept on disk
+    persist_upload(data, digest, filename)
+    frame_predictions = [future.result(timeout=INFERENCE_TIMEOUT) for future in batcher.submit_many(frames)]
+    # Inference time includes waiting for the batch to fill
+    preprocess_seconds, inference_seconds = preprocessed - start, time.perf_counter() - preprocessed
+    record_timing(preprocess_seconds, inference_seconds)
+    predictions = combine_frames(frame_predictions)
+
+    # Generate Text Report based on predictions
+    report_text = generate_report(predictions)
+    result = {"analysis": report_text, "raw_predictions": predictions, "frames": len(frames)}
+    if len(frames) > 1:
+        result["frame_predictions"] = frame_predictions
+    result["report"] = structured_report(predictions)
+    result_cache.put(digest, result)
+
+    return {
+        **result,
+        "image_hash": digest,
+        "cached": False,
+        "timing": {"preprocess_ms": round(preprocess_seconds * 1000, 2), "inference_ms": round(inference_seconds * 1000, 2)}
+    }
+
+# Asynchronous mode: studies are queued and processed by XRAY_JOB_WORKERS threads
+# Under serve.py every worker process claims from the shared jobs table
+job_queue = JobQueue(lambda data, filename: analyze_study(data, filename, wait_for_model=True))
 
 @app.route('/analyze_xray', methods=['POST'])
 def analyze_xray():
@@ -24,100 +138,76 @@ def analyze_xray():
         return jsonify({"status": "error", "msg": "No file uploaded"}), 400
     
     file = request.files['file']
-    filename = file.filename
-    save_path = os.path.join(UPLOAD_FOLDER, filename)
-    file.save(save_path)
+    # Decode straight from the request body; disk is optional and off the hot path
+    data = file.read()
+
+    # ?async=1 returns a job id right away; poll /jobs/<id> for the result
+    if request.args.get('async') == '1':
+        job_id = job_queue.submit(data, file.filename)
+        return jsonify({"status": "queued", "job_id": job_id}), 202
 
     try:
-        # REAL INFERENCE
-        predictions = predict_image(model, device, save_path)
-        
-        # Generate Text Report based on predictions
-        report_text = generate_report(predictions)
-        
-        return jsonify({
-            "status": "success",
-            "analysis": report_text,
-            "raw_predictions": predictions
-        })
+        return jsonify({"status": "success", **analyze_study(data, file.filename)})
+
+    except ModelNotReady as e:
+        return jsonify({"status": "error", "msg": str(e)}), 503
+
+    except InvalidStudy as e:
+        return jsonify({"status": "error", "msg": str(e)}), 400
 
     except Exception as e:
         print(f"Inference Error: {e}")
         return jsonify({"status": "error", "msg": str(e)}), 500
 
-def generate_report(predictions):
-    # Mapping for clinical explanations
-    DESCRIPTIONS = {
-        'Atelectasis': "Increased density and partial volume loss in lung segments.",
-        'Cardiomegaly': "Transverse cardiac diameter appears greater than 50% of the thoracic diameter.",
-        'Effusion': "Blunting of the costophrenic angle suggesting fluid accumulation.",
-        'Infiltration': "Ill-defined opacities or interstitial markings suggestive of parenchymal filling.",
-        'Mass': "Focal density greater than 3cm in diameter requiring further assessment.",
-        'Nodule': "Small circumscribed opacity less than 3cm in diameter.",
-        'Pneumonia': "Airspace consolidation pattern often associated with infectious processes.",
-        'Pneumothorax': "Visceral pleural line visible without peripheral lung markings.",
-        'Consolidation': "Airspaces filled with fluid, pus, or blood displacing air.",
-        'Edema': "Diffuse perihilar opacities or Kerley B lines suggesting vascular congestion.",
-        'Emphysema': "Hyperinflation of lung fields with flattened diaphragms.",
-        'Fibrosis': "Reticular opacities and volume loss suggestive of scarring.",
-        'Pleural_Thickening': "Irregularity or thickening of the pleural surface.",
-        'Hernia': "Anomalous presence of abdominal contents within the thoracic cavity."
-    }
-
-    # Filter findings with confidence >= 60%
-    significant_findings = [p for p in predictions if p[1] >= 60.0]
-
-    if not significant_findings:
-        return """
-### Clinical Impression (AI-Assisted)
-No significant radiographic abnormalities were detected above the system threshold (60.00% confidence). The lung fields appear clear and the cardiac silhouette is within normal limits.
-
-### Technical Notes
-Single frontal view limitation. Findings must be correlated with clinical symptoms. Overlapping soft tissue shadows can mimic pathology.
-
-### Safety Disclaimer
-This AI-generated analysis is for clinical assistance only and is not a diagnosis. Final interpretation must be performed by a licensed radiologist.
-"""
-
-    primary = significant_findings[0]
-    secondary = significant_findings[1:]
-
-    # Build Clinical Impression summary
-    primary_label = primary[0]
-    impression_text = f"Radiographic patterns suggestive of {primary_label.lower()} are observed as the dominant feature."
-    if secondary:
-        impression_text += f" Cannot exclude concurrent {secondary[0][0].lower()}."
-    impression_text += " Careful clinical correlation is recommended."
-
-    # Format Primary Suspicion
-    primary_section = f"""
-### Primary Suspicion
-• **{primary[0]}** – {primary[1]/100:.2f} confidence
-{DESCRIPTIONS.get(primary[0], "Radiographic features noted.")}
-"""
-
-    # Format Secondary Considerations
-    secondary_section = ""
-    if secondary:
-        secondary_section = "### Secondary Considerations\n"
-        for label, score in secondary:
-            explanation = DESCRIPTIONS.get(label, "May be considered based on minor radiographic indices.")
-            secondary_section += f"• **{label}** – {score/100:.2f} confidence\n{explanation}\n\n"
-
-    return f"""
-### Clinical Impression (AI-Assisted)
-{impression_text}
-
-{primary_section}
-{secondary_section}
-### Technical Notes
-- Single frontal view limitation (depth and fluid layering assessment restricted).
-- Clinical correlation with patient symptoms (fever, cough, history) is highly recommended.
-- Suggest follow-up imaging or CT correlation for definitive characterization if findings persist.
-
-### Safety Disclaimer
-This AI-generated analysis is for clinical assistance only and is not a diagnosis. Final interpretation must be performed by a licensed radiologist.
-"""
+@app.route('/jobs/bulk', methods=['POST'])
+def submit_bulk():
+    # A zip of studies (multipart 'file') or a server-side folder under XRAY_BULK_ROOT ({"folder": ...})
+    try:
+        if 'file' in request.files:
+            batch_id, job_ids = job_queue.submit_zip(request.files['file'])
+        else:
+            folder = (request.get_json(silent=True) or {}).get('folder')
+            if not folder:
+                return jsonify({"status": "error", "msg": "Upload a zip as 'file' or give a 'folder'"}), 400
+            batch_id, job_ids = job_queue.submit_folder(folder)
+    except PermissionError as e:
+        return jsonify({"status": "error", "msg": str(e)}), 403
+    except ValueError as e:
+        return jsonify({"status": "error", "msg": str(e)}), 400
+    return jsonify({"status": "queued", "batch_id": batch_id, "jobs": len(job_ids), "job_ids": job_ids}), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "msg": "Job not found"}), 404
+    return jsonify({"status": "success", "job": job})
+
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    # Bulk results: ?batch_id=&status=&limit=&offset=
+    try:
+        limit = min(int(request.args.get('limit', 100)), 1000)
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({"status": "error", "msg": "limit and offset must be integers"}), 400
+    jobs = job_queue.list(request.args.get('batch_id'), request.args.get('status'), limit, offset)
+    return jsonify({"status": "success", "jobs": jobs, "limit": limit, "offset": offset})
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    return jsonify({"status": "success", "batching": batcher.stats(), "cache": result_cache.stats() if result_cache else None, "timing": timing_stats(), "jobs": job_queue.stats()})
+
+def combine_frames(frame_predictions):
+    # Study-level score per label: the highest score over all frames
+    if len(frame_predictions) == 1:
+        return frame_predictions[0]
+    index = {label: i for i, label in enumerate(LABELS)}
+    scores = np.zeros((len(frame_predictions), len(LABELS)))
+    for row, predictions in zip(scores, frame_predictions):
+        for label, score in predictions:
+            row[index[label]] = score
+    return rank_scores(scores.max(axis=0, keepdims=True) / 100)[0]
 
 if __name__ == '__main__':
     print("Medical Imaging AI Service running on port 5003...")
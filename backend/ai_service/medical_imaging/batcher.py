@@ -0,0 +1,84 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# Dynamic micro-batching for the X-ray model.
+# Request threads submit preprocessed images and wait on a Future; a single
+# worker thread groups whatever has arrived (up to MAX_BATCH_SIZE images or
+# MAX_WAIT_MS after the first one) into one forward pass.
+
+MAX_BATCH_SIZE = int(os.environ.get('XRAY_MAX_BATCH_SIZE', 16))
+MAX_WAIT_MS = float(os.environ.get('XRAY_MAX_WAIT_MS', 20))
+
+
+class MicroBatcher:
+
+    def __init__(self, run_batch, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+        # run_batch(list of items) -> list of results, same order
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.submit_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.busy_seconds = 0.0
+        self.worker = threading.Thread(target=self._loop, daemon=True)
+        self.worker.start()
+
+    def submit(self, item):
+        future = Future()
+        self.queue.put((item, future))
+        return future
+
+    def submit_many(self, items):
+        # Enqueued back to back, so a study's frames share a forward pass (up to max_batch_size)
+        with self.submit_lock:
+            return [self.submit(item) for item in items]
+
+    def _collect(self):
+        # Block for the first item, then fill the batch until it is full or the wait expires
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, _ in batch]
+            futures = [future for _, future in batch]
+            start = time.perf_counter()
+            try:
+                results = self.run_batch(items)
+                for future, result in zip(futures, results):
+                    future.set_result(result)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+            with self.lock:
+                self.batches += 1
+                self.items += len(items)
+                self.busy_seconds += time.perf_counter() - start
+
+    def stats(self):
+        with self.lock:
+            return {
+                "batches": self.batches,
+                "images": self.items,
+                "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+                "avg_batch_ms": round(self.busy_seconds * 1000 / self.batches, 2) if self.batches else 0.0,
+                "queue_depth": self.queue.qsize(),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+            }
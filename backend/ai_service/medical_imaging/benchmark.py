@@ -0,0 +1,210 @@
+import io
+import sys
+import copy
+import time
+import subprocess
+import numpy as np
+import torch
+from PIL import Image
+from model import load_model, predict_batch, weights_version, get_transform, preprocess_image, LABELS
+from optimize import optimize_model, DEFAULT_OPTIONS, BACKENDS
+from decoding import read_dicom, dicom_pixels, dicom_frames
+
+# Run from this directory:
+#   python benchmark.py            throughput of one forward pass per batch, by batch size
+#   python benchmark.py --compare  fp32 vs optimized: latency, throughput, memory, per-label drift
+#   python benchmark.py --preprocess  per-image preprocessing time, legacy vs current pipeline
+#   python benchmark.py --dicom    uncompressed DICOM: checks PixelData is viewed in place, decode time
+BATCH_SIZES = [1, 2, 4, 8, 16, 32]
+RUNS = 5
+LATENCY_RUNS = 50
+THROUGHPUT_BATCH = 16
+DRIFT_IMAGES = 64
+PREPROCESS_RUNS = 20
+# Typical chest X-ray exports: 8-bit grayscale JPEG / PNG, a few thousand pixels per side
+PREPROCESS_INPUTS = [('JPEG', 'L', (2500, 2048)), ('PNG', 'L', (2500, 2048)), ('JPEG', 'RGB', (1024, 1024))]
+DICOM_SIZE = (3000, 2500) # rows, cols of the synthetic 12-bit study
+
+# Executed in a fresh interpreter so each variant's memory is measured alone
+MEMORY_PROBE = '''
+import sys, resource, torch
+from model import load_model, predict_batch
+model, device = load_model(variant=sys.argv[1])
+predict_batch(model, device, [torch.randn(3, 224, 224)] * int(sys.argv[2]))
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+'''
+
+
+def batch_sweep(model, device):
+    image = torch.randn(3, 224, 224)
+    predict_batch(model, device, [image]) # warm-up
+
+    print(f"{'Batch':>6}{'ms/batch':>12}{'images/s':>12}{'speedup':>10}")
+    baseline = None
+    for batch_size in BATCH_SIZES:
+        tensors = [image] * batch_size
+        start = time.perf_counter()
+        for _ in range(RUNS):
+            predict_batch(model, device, tensors)
+        per_batch = (time.perf_counter() - start) / RUNS
+        throughput = batch_size / per_batch
+        baseline = baseline or throughput
+        print(f"{batch_size:>6}{per_batch * 1000:>12.1f}{throughput:>12.1f}{throughput / baseline:>9.2f}x")
+
+
+def scores(model, batch):
+    with torch.no_grad():
+        return model(batch).numpy()
+
+
+def latency_ms(model, image):
+    scores(model, image) # warm-up (also triggers torch.compile)
+    timings = []
+    for _ in range(LATENCY_RUNS):
+        start = time.perf_counter()
+        scores(model, image)
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.percentile(timings, 50)), float(np.percentile(timings, 99))
+
+
+def throughput(model, batch):
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        scores(model, batch)
+    return len(batch) * RUNS / (time.perf_counter() - start)
+
+
+def peak_rss_mb(variant):
+    out = subprocess.run([sys.executable, '-c', MEMORY_PROBE, variant, str(THROUGHPUT_BATCH)],
+                         capture_output=True, text=True, check=True)
+    return float(out.stdout.split()[-1])
+
+
+def compare():
+    # Everything on CPU: the optimized path targets CPU-only nodes
+    fp32 = load_model(variant='fp32')[0].cpu()
+    variants = {"fp32": fp32}
+    for backend in BACKENDS:
+        options = {**DEFAULT_OPTIONS, "backend": backend}
+        model = optimize_model(copy.deepcopy(fp32), options)
+        if backend == 'torchscript':
+            with torch.no_grad():
+                model = torch.jit.freeze(torch.jit.trace(model, torch.randn(1, 3, 224, 224)))
+        elif backend == 'compile':
+            model = torch.compile(model)
+        variants[f"optimized ({backend})"] = model
+
+    image = torch.randn(1, 3, 224, 224)
+    batch = torch.randn(THROUGHPUT_BATCH, 3, 224, 224)
+    drift_batch = torch.randn(DRIFT_IMAGES, 3, 224, 224)
+    reference = scores(fp32, drift_batch)
+
+    print(f"Weights: {weights_version('fp32')}  options: {DEFAULT_OPTIONS}")
+    print(f"{'Model':<26}{'p50 (ms)':>10}{'p99 (ms)':>10}{'images/s':>10}{'max drift':>11}")
+    drifts = {}
+    for name, model in variants.items():
+        p50, p99 = latency_ms(model, image)
+        rate = throughput(model, batch)
+        drifts[name] = np.abs(scores(model, drift_batch) - reference).max(axis=0)
+        print(f"{name:<26}{p50:>10.1f}{p99:>10.1f}{rate:>10.1f}{drifts[name].max():>11.5f}")
+
+    print()
+    print(f"{'Peak RSS (MB)':<26}{'fp32':>10}{'optimized':>11}")
+    print(f"{'load + batch of ' + str(THROUGHPUT_BATCH):<26}{peak_rss_mb('fp32'):>10.1f}{peak_rss_mb('optimized'):>11.1f}")
+
+    # Largest absolute score difference per label (probabilities, 0-1) vs fp32
+    print()
+    names = [name for name in variants if name != 'fp32']
+    print(f"{'Label':<20}" + ''.join(f"{name.split()[-1]:>16}" for name in names))
+    for i, label in enumerate(LABELS):
+        print(f"{label:<20}" + ''.join(f"{drifts[name][i]:>16.5f}" for name in names))
+
+
+def legacy_preprocess(image):
+    # Pipeline before the cached transform / grayscale path, for comparison
+    return get_transform()(image.convert('RGB'))
+
+
+def encoded_image(fmt, mode, size):
+    gradient = np.linspace(0, 255, size[0] * size[1], dtype=np.float32).reshape(size[1], size[0])
+    noise = np.random.default_rng(0).normal(0, 20, gradient.shape)
+    pixels = np.clip(gradient + noise, 0, 255).astype(np.uint8)
+    image = Image.fromarray(pixels, 'L').convert(mode)
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def preprocess_timing():
+    print(f"{'Input':<24}{'legacy (ms)':>14}{'current (ms)':>14}{'speedup':>10}{'max diff':>10}")
+    for fmt, mode, size in PREPROCESS_INPUTS:
+        data = encoded_image(fmt, mode, size)
+        results = []
+        for fn in (legacy_preprocess, preprocess_image):
+            start = time.perf_counter()
+            for _ in range(PREPROCESS_RUNS):
+                tensor = fn(Image.open(io.BytesIO(data)))
+            results.append(((time.perf_counter() - start) * 1000 / PREPROCESS_RUNS, tensor))
+        (legacy_ms, legacy), (current_ms, current) = results
+        # Reduced-resolution JPEG decode changes pixels slightly; PNG should match closely
+        diff = (legacy - current).abs().max().item()
+        name = f"{fmt} {mode} {size[0]}x{size[1]}"
+        print(f"{name:<24}{legacy_ms:>14.1f}{current_ms:>14.1f}{legacy_ms / current_ms:>9.2f}x{diff:>10.3f}")
+
+
+def encoded_dicom(rows, cols):
+    # Uncompressed explicit VR little endian, 12 bits stored in 16
+    import pydicom
+    from pydicom.dataset import FileMetaDataset
+    from pydicom.uid import ExplicitVRLittleEndian, SecondaryCaptureImageStorage, generate_uid
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = SecondaryCaptureImageStorage
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    ds = pydicom.Dataset()
+    ds.file_meta = meta
+    ds.SOPClassUID = meta.MediaStorageSOPClassUID
+    ds.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+    ds.Rows, ds.Columns = rows, cols
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = 'MONOCHROME2'
+    ds.BitsAllocated, ds.BitsStored, ds.HighBit, ds.PixelRepresentation = 16, 12, 11, 0
+    ds.PixelData = np.random.default_rng(0).integers(0, 4096, (rows, cols), dtype=np.uint16).tobytes()
+    buffer = io.BytesIO()
+    if int(pydicom.__version__.split('.')[0]) >= 3:
+        ds.save_as(buffer, enforce_file_format=True)
+    else:
+        ds.is_little_endian, ds.is_implicit_VR = True, False
+        ds.save_as(buffer, write_like_original=False)
+    return buffer.getvalue(), ds
+
+
+def dicom_timing():
+    data, original = encoded_dicom(*DICOM_SIZE)
+    pixels, _, zero_copy = dicom_pixels(read_dicom(data), data)
+    # The fast path must be a view into the upload, not a decoded copy
+    assert zero_copy and np.shares_memory(pixels, np.frombuffer(data, dtype=np.uint8)), "PixelData was copied"
+    assert np.array_equal(pixels[0], original.pixel_array), "Zero-copy view does not match pydicom"
+
+    start = time.perf_counter()
+    for _ in range(PREPROCESS_RUNS):
+        dicom_frames(data)
+    current_ms = (time.perf_counter() - start) * 1000 / PREPROCESS_RUNS
+    start = time.perf_counter()
+    for _ in range(PREPROCESS_RUNS):
+        read_dicom(data).pixel_array
+    pixel_array_ms = (time.perf_counter() - start) * 1000 / PREPROCESS_RUNS
+    print(f"DICOM {DICOM_SIZE[0]}x{DICOM_SIZE[1]}: zero-copy view OK, decode + preprocess {current_ms:.1f} ms "
+          f"(pydicom pixel_array alone {pixel_array_ms:.1f} ms)")
+
+
+if __name__ == '__main__':
+    if '--compare' in sys.argv:
+        compare()
+    elif '--preprocess' in sys.argv:
+        preprocess_timing()
+    elif '--dicom' in sys.argv:
+        dicom_timing()
+    else:
+        model, device = load_model()
+        batch_sweep(model, device)
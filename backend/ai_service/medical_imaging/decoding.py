@@ -0,0 +1,147 @@
+import io
+import numpy as np
+from PIL import Image, ImageSequence
+from model import preprocess_image, preprocess_array, RESIZE
+
+# Study decoding: DICOM and 16-bit TIFF next to the ordinary PIL formats.
+# High bit-depth pixels are never converted to float at full resolution:
+# they are windowed and area-downsampled a strip of rows at a time, so the
+# only full-size array is the integer pixel data itself (for uncompressed
+# DICOM, a zero-copy view into the uploaded bytes).
+# Every study decodes to a list of (3, 224, 224) tensors, one per frame.
+
+STRIP_BLOCKS = 16 # output rows produced per strip
+HIGH_BIT_MODES = ('I;16', 'I;16B', 'I;16L', 'I;16S', 'I', 'F')
+PERCENTILE_WINDOW = (0.5, 99.5) # when the file carries no window
+SAMPLE_STRIDE = 8 # pixel stride of the sample used for percentile windows
+
+
+def is_dicom(data):
+    return len(data) > 132 and data[128:132] == b'DICM'
+
+
+def downsample_factor(rows, cols):
+    # Integer block size that keeps the short side >= RESIZE
+    return max(1, min(rows, cols) // RESIZE)
+
+
+def window_downsample(pixels, factor, low, high, slope=1.0, intercept=0.0, invert=False, bits_stored=None):
+    # (H, W) integer pixels -> (H // factor, W // factor) float32 in [0, 1]
+    rows, cols = pixels.shape[0] // factor, pixels.shape[1] // factor
+    out = np.empty((rows, cols), dtype=np.float32)
+    scale = slope / max(high - low, 1e-6)
+    offset = (intercept - low) / max(high - low, 1e-6)
+    for top in range(0, rows, STRIP_BLOCKS):
+        bottom = min(top + STRIP_BLOCKS, rows)
+        strip = pixels[top * factor:bottom * factor, :cols * factor]
+        if bits_stored:
+            strip = strip & ((1 << bits_stored) - 1)
+        strip = strip.astype(np.float32)
+        strip *= scale
+        strip += offset
+        np.clip(strip, 0.0, 1.0, out=strip)
+        out[top:bottom] = strip.reshape(bottom - top, factor, cols, factor).mean(axis=(1, 3))
+    if invert:
+        np.subtract(1.0, out, out=out)
+    return out
+
+
+def percentile_window(pixels, slope=1.0, intercept=0.0):
+    sample = pixels[::SAMPLE_STRIDE, ::SAMPLE_STRIDE].astype(np.float32) * slope + intercept
+    low, high = np.percentile(sample, PERCENTILE_WINDOW)
+    return float(low), float(high)
+
+
+def _first(value):
+    # Window Center / Width may be multi-valued; the first pair is the default
+    try:
+        return float(value[0])
+    except TypeError:
+        return float(value)
+
+
+def pixel_data_offset(ds):
+    # Byte offset of the (still unread) PixelData value in the uploaded file, or None
+    try:
+        element = ds.get_item('PixelData', keep_deferred=True) # pydicom >= 3
+    except TypeError:
+        # pydicom 2.x get_item() reads deferred values; the raw element is still in the dataset dict
+        element = ds._dict.get(0x7FE00010)
+    return getattr(element, 'value_tell', None)
+
+
+def read_dicom(data):
+    try:
+        import pydicom
+    except ImportError:
+        raise ValueError("DICOM support requires pydicom (pip install pydicom)")
+
+    # Large elements stay unread, so PixelData can be viewed in place
+    ds = pydicom.dcmread(io.BytesIO(data), defer_size='1 KB')
+    if getattr(ds, 'SamplesPerPixel', 1) != 1:
+        raise ValueError("Only grayscale (single-sample) DICOM images are supported")
+    return ds
+
+
+def dicom_pixels(ds, data):
+    # -> ((frames, rows, cols) integer pixels, overlay mask bits or None, zero_copy)
+    rows, cols = int(ds.Rows), int(ds.Columns)
+    n_frames = int(getattr(ds, 'NumberOfFrames', 1) or 1)
+    syntax = ds.file_meta.TransferSyntaxUID
+    bits_allocated = int(ds.BitsAllocated)
+    bits_stored = int(getattr(ds, 'BitsStored', bits_allocated))
+    signed = int(getattr(ds, 'PixelRepresentation', 0)) == 1
+
+    offset = pixel_data_offset(ds) if not syntax.is_compressed and bits_allocated in (8, 16, 32) else None
+    count = n_frames * rows * cols
+    if offset is not None and offset + count * bits_allocated // 8 <= len(data):
+        dtype = np.dtype(f"{'i' if signed else 'u'}{bits_allocated // 8}")
+        dtype = dtype.newbyteorder('<' if syntax.is_little_endian else '>')
+        pixels = np.frombuffer(data, dtype=dtype, count=count, offset=offset).reshape(n_frames, rows, cols)
+        # Unused high bits may hold overlay data
+        mask_bits = bits_stored if not signed and bits_stored < bits_allocated else None
+        return pixels, mask_bits, True
+    # Compressed transfer syntax (or an unusual layout): decoded by pydicom's pixel handlers
+    return ds.pixel_array.reshape(n_frames, rows, cols), None, False
+
+
+def dicom_frames(data):
+    ds = read_dicom(data)
+    rows, cols = int(ds.Rows), int(ds.Columns)
+    pixels, mask_bits, _ = dicom_pixels(ds, data)
+
+    slope = float(getattr(ds, 'RescaleSlope', 1.0) or 1.0)
+    intercept = float(getattr(ds, 'RescaleIntercept', 0.0) or 0.0)
+    invert = getattr(ds, 'PhotometricInterpretation', '') == 'MONOCHROME1'
+    if 'WindowCenter' in ds and 'WindowWidth' in ds:
+        center, width = _first(ds.WindowCenter), _first(ds.WindowWidth)
+        window = (center - width / 2, center + width / 2)
+    else:
+        window = percentile_window(pixels[0], slope, intercept)
+
+    factor = downsample_factor(rows, cols)
+    return [
+        preprocess_array(window_downsample(frame, factor, *window, slope=slope, intercept=intercept,
+                                           invert=invert, bits_stored=mask_bits))
+        for frame in pixels
+    ]
+
+
+def high_bit_frames(image):
+    # 16-bit / 32-bit / float TIFF pages, windowed per page
+    tensors = []
+    for page in ImageSequence.Iterator(image):
+        pixels = np.asarray(page)
+        factor = downsample_factor(*pixels.shape)
+        tensors.append(preprocess_array(window_downsample(pixels, factor, *percentile_window(pixels))))
+    return tensors
+
+
+def decode_study(data):
+    # Uploaded bytes -> list of model-ready tensors (one per frame)
+    if is_dicom(data):
+        return dicom_frames(data)
+    image = Image.open(io.BytesIO(data))
+    if image.mode in HIGH_BIT_MODES:
+        return high_bit_frames(image)
+    return [preprocess_image(image)]
@@ -0,0 +1,272 @@
+import os
+import json
+import uuid
+import time
+import queue
+import sqlite3
+import zipfile
+import threading
+
+# Asynchronous analysis jobs.
+# A submission is spooled to disk and recorded in SQLite, then returns a job id
+# immediately; a fixed pool of worker threads feeds the studies to the model
+# (through the micro-batcher), so throughput is bounded by compute rather than
+# by open HTTP connections. Job state and results live in SQLite, so they can
+# be polled from any request and unfinished jobs are resumed after a restart.
+#
+# Several serving processes (serve.py) share one database. Workers claim the
+# oldest 'queued' row with a conditional UPDATE, so any idle process picks up
+# work no matter which one accepted it; the in-process queue only wakes them
+# early. Each process heartbeats in job_owners, and a 'running' job goes back
+# to 'queued' only once its owner has stopped heartbeating.
+
+JOBS_DB = os.environ.get('XRAY_JOBS_DB', 'jobs.db')
+JOBS_DIR = os.environ.get('XRAY_JOBS_DIR', 'jobs')
+JOB_WORKERS = int(os.environ.get('XRAY_JOB_WORKERS', 16))
+POLL_SECONDS = 2.0 # idle workers look for queued rows (e.g. from other processes) this often
+HEARTBEAT_SECONDS = 5.0
+STALE_SECONDS = float(os.environ.get('XRAY_JOB_STALE_SECONDS', 30)) # owner presumed dead after this long silent
+# Server-side folders accepted for bulk re-analysis must live under this root ('' = disabled)
+BULK_ROOT = os.environ.get('XRAY_BULK_ROOT', '')
+STUDY_EXTENSIONS = ('.dcm', '.dicom', '.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    batch_id TEXT,
+    filename TEXT,
+    source TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    owner TEXT,
+    claimed_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch_id, created_at);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS job_owners (
+    owner TEXT PRIMARY KEY,
+    pid INTEGER NOT NULL,
+    heartbeat_at REAL NOT NULL
+);
+"""
+# Columns added after the first release, for databases created before them
+ADDED_COLUMNS = [('owner', 'TEXT'), ('claimed_at', 'REAL')]
+
+
+def is_study(name):
+    base = os.path.basename(name)
+    return not base.startswith('.') and os.path.splitext(base)[1].lower() in STUDY_EXTENSIONS
+
+
+class JobQueue:
+
+    def __init__(self, analyze, db_path=JOBS_DB, jobs_dir=JOBS_DIR, workers=JOB_WORKERS):
+        # analyze(data, filename) -> JSON-serializable result
+        self.analyze = analyze
+        self.db_path = db_path
+        self.jobs_dir = jobs_dir
+        os.makedirs(jobs_dir, exist_ok=True)
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}" # unique even if the pid is reused
+        self.queue = queue.Queue() # wake-ups only; the jobs table is the queue
+        self.lock = threading.Lock()
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+            columns = {row['name'] for row in db.execute("PRAGMA table_info(jobs)")}
+            for column, kind in ADDED_COLUMNS:
+                if column not in columns:
+                    db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        self._heartbeat()
+        self._requeue_orphans()
+        threading.Thread(target=self._monitor, daemon=True, name="xray-job-monitor").start()
+        self.workers = [threading.Thread(target=self._work, daemon=True, name=f"xray-job-{i}") for i in range(workers)]
+        for worker in self.workers:
+            worker.start()
+
+    def _connect(self):
+        db = sqlite3.connect(self.db_path, timeout=30)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def _heartbeat(self):
+        with self.lock, self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO job_owners (owner, pid, heartbeat_at) VALUES (?, ?, ?)",
+                       (self.owner, os.getpid(), time.time()))
+
+    def _requeue_orphans(self):
+        # Jobs whose owning process stopped heartbeating (crashed / restarted) are queued again;
+        # jobs still running in a live process are left alone
+        cutoff = time.time() - STALE_SECONDS
+        with self.lock, self._connect() as db:
+            requeued = db.execute(
+                "UPDATE jobs SET status = 'queued', owner = NULL, claimed_at = NULL, started_at = NULL "
+                "WHERE status = 'running' AND (owner IS NULL OR owner NOT IN "
+                "(SELECT owner FROM job_owners WHERE heartbeat_at >= ?))", (cutoff,)).rowcount
+            db.execute("DELETE FROM job_owners WHERE heartbeat_at < ?", (cutoff,))
+        for _ in range(requeued):
+            self.queue.put(None)
+        if requeued:
+            print(f"Requeued {requeued} X-ray jobs from stopped workers")
+
+    def _monitor(self):
+        while True:
+            time.sleep(HEARTBEAT_SECONDS)
+            try:
+                self._heartbeat()
+                self._requeue_orphans()
+            except sqlite3.Error as e:
+                print(f"Job Monitor Error: {e}")
+
+    def _claim(self):
+        # Oldest queued job -> (id, filename, source), or None; the conditional UPDATE makes
+        # the claim atomic across threads and processes
+        with self.lock, self._connect() as db:
+            while True:
+                row = db.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at, rowid LIMIT 1").fetchone()
+                if row is None:
+                    return None
+                now = time.time()
+                claimed = db.execute("UPDATE jobs SET status = 'running', owner = ?, claimed_at = ?, started_at = ? "
+                                     "WHERE id = ? AND status = 'queued'", (self.owner, now, now, row['id'])).rowcount
+                if claimed:
+                    job = db.execute("SELECT id, filename, source FROM jobs WHERE id = ?", (row['id'],)).fetchone()
+                    return job['id'], job['filename'], json.loads(job['source'])
+
+    def _add(self, sources, batch_id=None):
+        # sources: list of (filename, source dict) -> job ids
+        now = time.time()
+        rows = [(uuid.uuid4().hex, batch_id, filename, json.dumps(source), 'queued', now) for filename, source in sources]
+        with self.lock, self._connect() as db:
+            db.executemany("INSERT INTO jobs (id, batch_id, filename, source, status, created_at) VALUES (?, ?, ?, ?, ?, ?)", rows)
+        for _ in rows:
+            self.queue.put(None)
+        return [row[0] for row in rows]
+
+    def submit(self, data, filename):
+        # One uploaded study; spooled so the request can return right away
+        path = os.path.join(self.jobs_dir, f"{uuid.uuid4().hex}.upload")
+        with open(path, 'wb') as f:
+            f.write(data)
+        return self._add([(filename, {"path": path, "spooled": True})])[0]
+
+    def submit_zip(self, stream):
+        # Every study inside an uploaded zip becomes a job of one batch; members are read on demand
+        batch_id = uuid.uuid4().hex
+        path = os.path.join(self.jobs_dir, f"{batch_id}.zip")
+        stream.save(path)
+        try:
+            with zipfile.ZipFile(path) as archive:
+                members = [info.filename for info in archive.infolist() if not info.is_dir() and is_study(info.filename)]
+        except zipfile.BadZipFile:
+            os.remove(path)
+            raise ValueError("Uploaded file is not a valid zip archive")
+        if not members:
+            os.remove(path)
+            raise ValueError("No studies found in the zip archive")
+        return batch_id, self._add([(name, {"zip": path, "member": name}) for name in members], batch_id)
+
+    def submit_folder(self, folder):
+        # Server-side folder (e.g. a nightly PACS export) under BULK_ROOT
+        if not BULK_ROOT:
+            raise PermissionError("Folder submission is disabled (set XRAY_BULK_ROOT)")
+        root = os.path.realpath(BULK_ROOT)
+        folder = os.path.realpath(os.path.join(root, folder))
+        if os.path.commonpath([root, folder]) != root or not os.path.isdir(folder):
+            raise ValueError("Folder must be an existing directory under the bulk root")
+        paths = sorted(
+            os.path.join(dirpath, name)
+            for dirpath, _, names in os.walk(folder)
+            for name in names if is_study(name)
+        )
+        if not paths:
+            raise ValueError("No studies found in the folder")
+        batch_id = uuid.uuid4().hex
+        return batch_id, self._add([(os.path.relpath(path, root), {"path": path}) for path in paths], batch_id)
+
+    def _read(self, source):
+        if "zip" in source:
+            with zipfile.ZipFile(source["zip"]) as archive:
+                return archive.read(source["member"])
+        with open(source["path"], 'rb') as f:
+            return f.read()
+
+    def _cleanup(self, job_id, source):
+        # Spooled uploads go right away; a zip once its batch has no unfinished jobs
+        try:
+            if source.get("spooled"):
+                os.remove(source["path"])
+            elif "zip" in source:
+                with self._connect() as db:
+                    batch_id = db.execute("SELECT batch_id FROM jobs WHERE id = ?", (job_id,)).fetchone()['batch_id']
+                    pending = db.execute("SELECT COUNT(*) FROM jobs WHERE batch_id = ? AND status IN ('queued', 'running')",
+                                         (batch_id,)).fetchone()[0]
+                if not pending and os.path.exists(source["zip"]):
+                    os.remove(source["zip"])
+        except OSError as e:
+            print(f"Job Cleanup Error: {e}")
+
+    def _work(self):
+        while True:
+            job = self._claim()
+            if job is None:
+                try:
+                    self.queue.get(timeout=POLL_SECONDS)
+                except queue.Empty:
+                    pass
+                continue
+
+            job_id, filename, source = job
+            try:
+                result = self.analyze(self._read(source), filename)
+                update = ("done", json.dumps(result), None)
+            except Exception as e:
+                print(f"Job Error ({job_id}): {e}")
+                update = ("failed", None, str(e))
+            # Only while still the owner: a job requeued from under a stalled process is not overwritten
+            with self.lock, self._connect() as db:
+                db.execute("UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ? AND owner = ?",
+                           (*update, time.time(), job_id, self.owner))
+            self._cleanup(job_id, source)
+
+    def _row(self, row):
+        job = {
+            "job_id": row['id'],
+            "batch_id": row['batch_id'],
+            "filename": row['filename'],
+            "status": row['status'],
+            "created_at": row['created_at'],
+            "finished_at": row['finished_at'],
+        }
+        if row['result']:
+            job["result"] = json.loads(row['result'])
+        if row['error']:
+            job["error"] = row['error']
+        return job
+
+    def get(self, job_id):
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row(row) if row else None
+
+    def list(self, batch_id=None, status=None, limit=100, offset=0):
+        # Bulk results, oldest first
+        query, params = "SELECT * FROM jobs WHERE 1 = 1", []
+        if batch_id:
+            query += " AND batch_id = ?"
+            params.append(batch_id)
+        if status:
+            query += " AND status = ?"
+            params.append(status)
+        query += " ORDER BY created_at, rowid LIMIT ? OFFSET ?"
+        with self._connect() as db:
+            rows = db.execute(query, (*params, limit, offset)).fetchall()
+        return [self._row(row) for row in rows]
+
+    def stats(self):
+        with self._connect() as db:
+            counts = dict(db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {"queued": counts.get('queued', 0), "running": counts.get('running', 0), "done": counts.get('done', 0),
+                "failed": counts.get('failed', 0), "workers": len(self.workers), "owner": self.owner}
@@ -0,0 +1,135 @@
+import io
+import os
+import sys
+import time
+import signal
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+from PIL import Image
+
+# Load test for serve.py: tries every workers x intra-op-threads split that uses
+# the given core count, drives each with concurrent /analyze_xray uploads and
+# reports throughput and latency. Caching and upload persistence are disabled
+# so every request reaches the model.
+#
+# Run from this directory: python loadtest.py --cores 8 --duration 30 --concurrency 32
+
+IMAGE_POOL = 32
+IMAGE_SIZE = (1024, 1024)
+READY_TIMEOUT = 600 # seconds
+
+
+def make_images(count):
+    rng = np.random.default_rng(0)
+    images = []
+    for _ in range(count):
+        pixels = rng.integers(0, 256, size=IMAGE_SIZE, dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels, 'L').save(buffer, format='PNG')
+        images.append(buffer.getvalue())
+    return images
+
+
+def splits(cores):
+    # (workers, intra-op threads) pairs that multiply to the core count
+    return [(workers, cores // workers) for workers in range(1, cores + 1) if cores % workers == 0]
+
+
+def wait_until_ready(url, workers):
+    # Connections land on arbitrary workers, so require a run of healthy answers
+    deadline = time.time() + READY_TIMEOUT
+    healthy = 0
+    while time.time() < deadline:
+        try:
+            healthy = healthy + 1 if requests.get(f"{url}/health", timeout=5).status_code == 200 else 0
+        except requests.RequestException:
+            healthy = 0
+        if healthy >= 4 * workers:
+            return
+        time.sleep(0.25)
+    raise TimeoutError("Server did not become ready")
+
+
+def drive(url, images, duration, concurrency):
+    deadline = time.time() + duration
+
+    def client(offset):
+        session = requests.Session()
+        latencies, errors, i = [], 0, offset
+        while time.time() < deadline:
+            start = time.perf_counter()
+            response = session.post(f"{url}/analyze_xray", files={"file": ("study.png", images[i % len(images)])}, timeout=300)
+            if response.status_code == 200:
+                latencies.append((time.perf_counter() - start) * 1000)
+            else:
+                errors += 1
+            i += 1
+        return latencies, errors
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(client, range(concurrency)))
+    elapsed = time.time() - start
+    latencies = [ms for result in results for ms in result[0]]
+    errors = sum(result[1] for result in results)
+    return len(latencies) / elapsed, latencies, errors
+
+
+def run_split(workers, threads, args, images):
+    port = args.port
+    env = {
+        **os.environ,
+        "XRAY_WORKERS": str(workers),
+        "XRAY_INTRA_OP_THREADS": str(threads),
+        "XRAY_INTER_OP_THREADS": "1",
+        "XRAY_PORT": str(port),
+        "XRAY_CACHE_SIZE": "0",
+        "XRAY_CACHE_DIR": "",
+        "XRAY_PERSIST_UPLOADS": "0",
+        "XRAY_JOBS_DB": os.path.join(args.scratch, f"jobs_{workers}x{threads}.db"),
+        "XRAY_JOBS_DIR": os.path.join(args.scratch, "jobs"),
+    }
+    server = subprocess.Popen([sys.executable, 'serve.py'], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        wait_until_ready(url, workers)
+        drive(url, images, args.warmup, args.concurrency)
+        return drive(url, images, args.duration, args.concurrency)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the best workers x threads split for serve.py")
+    parser.add_argument('--cores', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--duration', type=float, default=30, help="measured seconds per split")
+    parser.add_argument('--warmup', type=float, default=5, help="unmeasured seconds per split")
+    parser.add_argument('--concurrency', type=int, default=32, help="concurrent HTTP clients")
+    parser.add_argument('--port', type=int, default=5103)
+    args = parser.parse_args()
+    args.scratch = tempfile.mkdtemp(prefix='xray-loadtest-')
+
+    images = make_images(IMAGE_POOL)
+    print(f"{args.cores} cores, {args.concurrency} clients, {args.duration:.0f}s per split")
+    print(f"{'workers x threads':<20}{'req/s':>10}{'p50 (ms)':>12}{'p99 (ms)':>12}{'errors':>8}")
+    results = []
+    for workers, threads in splits(args.cores):
+        rate, latencies, errors = run_split(workers, threads, args, images)
+        p50, p99 = (np.percentile(latencies, 50), np.percentile(latencies, 99)) if latencies else (float('nan'),) * 2
+        results.append((rate, workers, threads))
+        print(f"{f'{workers} x {threads}':<20}{rate:>10.2f}{p50:>12.1f}{p99:>12.1f}{errors:>8}")
+
+    rate, workers, threads = max(results)
+    print(f"\nBest: XRAY_WORKERS={workers} XRAY_INTRA_OP_THREADS={threads} ({rate:.2f} req/s)")
+
+
+if __name__ == '__main__':
+    main()
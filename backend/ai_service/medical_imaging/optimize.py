@@ -0,0 +1,147 @@
+import os
+import json
+import argparse
+import warnings
+import contextlib
+import torch
+import torch.nn as nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+# Optional CPU-optimized DenseNet121.
+# Starting from the fp32 model: fold BatchNorm into the preceding convolutions,
+# quantize the Linear head to INT8 (dynamic), switch to channels-last, then
+# trace to TorchScript and save a ready-to-load artifact. The options used and
+# the source weights version travel inside the artifact (extra files).
+#
+# Build the artifact: python optimize.py
+# Serve it:           XRAY_MODEL_VARIANT=optimized python app.py
+
+OPTIMIZED_MODEL_PATH = os.environ.get('XRAY_OPTIMIZED_MODEL_PATH', 'densenet121_chestxray_optimized.pt')
+
+
+def _flag(name, default):
+    return os.environ.get(name, default) == '1'
+
+
+# Selected per deployment; each one can be switched off independently
+DEFAULT_OPTIONS = {
+    "fuse": _flag('XRAY_OPT_FUSE', '1'),
+    "quantize": _flag('XRAY_OPT_QUANTIZE', '1'),
+    "channels_last": _flag('XRAY_OPT_CHANNELS_LAST', '1'),
+    "backend": os.environ.get('XRAY_OPT_BACKEND', 'torchscript'), # torchscript | compile | eager
+}
+BACKENDS = ('torchscript', 'compile', 'eager')
+
+
+def fuse_conv_bn(model):
+    # DenseNet is pre-activation (BN -> ReLU -> Conv), so only a BN that directly
+    # follows a conv can be folded: the stem (conv0 -> norm0) and the bottleneck
+    # of every dense layer (conv1 -> norm2). The folded BN becomes an Identity.
+    features = model.features
+    features.conv0 = fuse_conv_bn_eval(features.conv0, features.norm0)
+    features.norm0 = nn.Identity()
+    for module in features.modules():
+        if hasattr(module, 'conv1') and hasattr(module, 'norm2'):
+            module.conv1 = fuse_conv_bn_eval(module.conv1, module.norm2)
+            module.norm2 = nn.Identity()
+    return model
+
+
+class ChannelsLast(nn.Module):
+    # Converts NCHW input so callers keep passing ordinary contiguous batches
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x):
+        return self.model(x.contiguous(memory_format=torch.channels_last))
+
+
+def optimize_model(model, options=None):
+    # Eager-mode optimizations on an fp32 model (CPU only; fusion modifies it in place)
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+    model = model.cpu().eval()
+    if options["fuse"]:
+        model = fuse_conv_bn(model)
+    if options["quantize"]:
+        model = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+    if options["channels_last"]:
+        model = ChannelsLast(model.to(memory_format=torch.channels_last))
+    return model.eval()
+
+
+@contextlib.contextmanager
+def torchscript_deprecation_silenced():
+    # TorchScript (jit.trace / freeze / save / load) is deprecated on recent torch and
+    # warns with FutureWarning on every call. It still works, and the artifact keeps its
+    # format, but the replacement path is torch.export + AOTInductor
+    # (torch._inductor.aoti_compile_and_package). Move the 'torchscript' backend there
+    # before upgrading to a torch that drops torch.jit; 'compile' and 'eager' are unaffected.
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', FutureWarning)
+        yield
+
+
+def save_optimized(model, path, options, source_version):
+    # Trace with a dummy batch and save as TorchScript, options embedded
+    example = torch.randn(1, 3, 224, 224)
+    meta = {"options": options, "source_version": source_version}
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with torch.no_grad(), torchscript_deprecation_silenced():
+        traced = torch.jit.freeze(torch.jit.trace(model, example))
+        torch.jit.save(traced, tmp_path, _extra_files={"meta.json": json.dumps(meta)})
+    os.replace(tmp_path, path)
+    return traced
+
+
+def load_optimized(path):
+    # -> (TorchScript module, metadata)
+    extra = {"meta.json": ""}
+    with torchscript_deprecation_silenced():
+        model = torch.jit.load(path, map_location='cpu', _extra_files=extra)
+    return model.eval(), json.loads(extra["meta.json"] or '{}')
+
+
+def build_optimized(fp32_model, source_version, options=None, path=OPTIMIZED_MODEL_PATH):
+    # Serving entry point: reuse a matching artifact, otherwise optimize (and save when traced)
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+    if options["backend"] not in BACKENDS:
+        raise ValueError(f"Unknown optimization backend '{options['backend']}' (choose from {', '.join(BACKENDS)})")
+
+    if options["backend"] == 'torchscript' and os.path.exists(path):
+        model, meta = load_optimized(path)
+        if meta.get("source_version") == source_version and meta.get("options") == options:
+            print(f"Loaded optimized model from {path}")
+            return model
+        print(f"Optimized model at {path} is stale (built from {meta.get('source_version')}), rebuilding...")
+
+    model = optimize_model(fp32_model, options)
+    if options["backend"] == 'torchscript':
+        model = save_optimized(model, path, options, source_version)
+        print(f"Saved optimized model to {path}")
+    elif options["backend"] == 'compile':
+        # Compiled lazily on the first forward pass; cannot be saved
+        model = torch.compile(model)
+    return model
+
+
+if __name__ == '__main__':
+    from model import load_model, weights_version
+
+    parser = argparse.ArgumentParser(description="Build the CPU-optimized DenseNet121 artifact")
+    parser.add_argument('--output', default=OPTIMIZED_MODEL_PATH)
+    parser.add_argument('--no-fuse', action='store_true', help="keep BatchNorm layers")
+    parser.add_argument('--no-quantize', action='store_true', help="keep the Linear head in fp32")
+    parser.add_argument('--no-channels-last', action='store_true', help="keep NCHW memory format")
+    args = parser.parse_args()
+
+    options = {
+        "fuse": DEFAULT_OPTIONS["fuse"] and not args.no_fuse,
+        "quantize": DEFAULT_OPTIONS["quantize"] and not args.no_quantize,
+        "channels_last": DEFAULT_OPTIONS["channels_last"] and not args.no_channels_last,
+        "backend": 'torchscript',
+    }
+    fp32_model, _ = load_model(variant='fp32')
+    model = optimize_model(fp32_model, options)
+    save_optimized(model, args.output, options, weights_version('fp32'))
+    print(f"Saved optimized model to {args.output} ({os.path.getsize(args.output) / 1e6:.1f} MB) with {options}")
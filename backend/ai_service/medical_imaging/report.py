@@ -0,0 +1,125 @@
+import os
+
+# Report rendering for ranked predictions [(label, score%)], highest first.
+# Descriptions and templates are built once at import; a report is a few
+# str.format calls. FINDING_THRESHOLD (XRAY_FINDING_THRESHOLD, in %) decides
+# which labels count as findings.
+
+FINDING_THRESHOLD = float(os.environ.get('XRAY_FINDING_THRESHOLD', 60.0))
+
+# Mapping for clinical explanations
+DESCRIPTIONS = {
+    'Atelectasis': "Increased density and partial volume loss in lung segments.",
+    'Cardiomegaly': "Transverse cardiac diameter appears greater than 50% of the thoracic diameter.",
+    'Effusion': "Blunting of the costophrenic angle suggesting fluid accumulation.",
+    'Infiltration': "Ill-defined opacities or interstitial markings suggestive of parenchymal filling.",
+    'Mass': "Focal density greater than 3cm in diameter requiring further assessment.",
+    'Nodule': "Small circumscribed opacity less than 3cm in diameter.",
+    'Pneumonia': "Airspace consolidation pattern often associated with infectious processes.",
+    'Pneumothorax': "Visceral pleural line visible without peripheral lung markings.",
+    'Consolidation': "Airspaces filled with fluid, pus, or blood displacing air.",
+    'Edema': "Diffuse perihilar opacities or Kerley B lines suggesting vascular congestion.",
+    'Emphysema': "Hyperinflation of lung fields with flattened diaphragms.",
+    'Fibrosis': "Reticular opacities and volume loss suggestive of scarring.",
+    'Pleural_Thickening': "Irregularity or thickening of the pleural surface.",
+    'Hernia': "Anomalous presence of abdominal contents within the thoracic cavity."
+}
+PRIMARY_FALLBACK = "Radiographic features noted."
+SECONDARY_FALLBACK = "May be considered based on minor radiographic indices."
+
+SAFETY_DISCLAIMER = """### Safety Disclaimer
+This AI-generated analysis is for clinical assistance only and is not a diagnosis. Final interpretation must be performed by a licensed radiologist.
+"""
+
+NO_FINDINGS_TEMPLATE = """
+### Clinical Impression (AI-Assisted)
+No significant radiographic abnormalities were detected above the system threshold ({threshold:.2f}% confidence). The lung fields appear clear and the cardiac silhouette is within normal limits.
+
+### Technical Notes
+Single frontal view limitation. Findings must be correlated with clinical symptoms. Overlapping soft tissue shadows can mimic pathology.
+
+""" + SAFETY_DISCLAIMER
+
+PRIMARY_TEMPLATE = """
+### Primary Suspicion
+• **{label}** – {confidence:.2f} confidence
+{description}
+"""
+
+SECONDARY_HEADER = "### Secondary Considerations\n"
+SECONDARY_TEMPLATE = "• **{label}** – {confidence:.2f} confidence\n{description}\n\n"
+
+REPORT_TEMPLATE = """
+### Clinical Impression (AI-Assisted)
+{impression}
+
+{primary_section}
+{secondary_section}
+### Technical Notes
+- Single frontal view limitation (depth and fluid layering assessment restricted).
+- Clinical correlation with patient symptoms (fever, cough, history) is highly recommended.
+- Suggest follow-up imaging or CT correlation for definitive characterization if findings persist.
+
+""" + SAFETY_DISCLAIMER
+
+
+def significant_findings(predictions, threshold=FINDING_THRESHOLD):
+    # Predictions are ranked, so the findings are the prefix above the threshold; rank_scores
+    # already counted it with one comparison over the batch's score matrix
+    if getattr(predictions, 'threshold', None) == threshold:
+        return list(predictions[:predictions.findings])
+    count = 0
+    for _, score in predictions:
+        if score < threshold:
+            break
+        count += 1
+    return predictions[:count]
+
+
+def impression(findings):
+    text = f"Radiographic patterns suggestive of {findings[0][0].lower()} are observed as the dominant feature."
+    if len(findings) > 1:
+        text += f" Cannot exclude concurrent {findings[1][0].lower()}."
+    return text + " Careful clinical correlation is recommended."
+
+
+def structured_report(predictions, threshold=FINDING_THRESHOLD):
+    # Machine-readable counterpart of generate_report
+    findings = significant_findings(predictions, threshold)
+    return {
+        "threshold": threshold,
+        "impression": impression(findings) if findings else None,
+        "findings": [
+            {
+                "label": label,
+                "score": score,
+                "role": "primary" if i == 0 else "secondary",
+                "description": DESCRIPTIONS.get(label, PRIMARY_FALLBACK if i == 0 else SECONDARY_FALLBACK),
+            }
+            for i, (label, score) in enumerate(findings)
+        ],
+    }
+
+
+def generate_report(predictions, threshold=FINDING_THRESHOLD):
+    findings = significant_findings(predictions, threshold)
+    if not findings:
+        return NO_FINDINGS_TEMPLATE.format(threshold=threshold)
+
+    (primary_label, primary_score), secondary = findings[0], findings[1:]
+    primary_section = PRIMARY_TEMPLATE.format(
+        label=primary_label,
+        confidence=primary_score / 100,
+        description=DESCRIPTIONS.get(primary_label, PRIMARY_FALLBACK),
+    )
+    secondary_section = ""
+    if secondary:
+        secondary_section = SECONDARY_HEADER + "".join(
+            SECONDARY_TEMPLATE.format(label=label, confidence=score / 100, description=DESCRIPTIONS.get(label, SECONDARY_FALLBACK))
+            for label, score in secondary
+        )
+    return REPORT_TEMPLATE.format(
+        impression=impression(findings),
+        primary_section=primary_section,
+        secondary_section=secondary_section,
+    )
@@ -0,0 +1,82 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+
+# Analysis cache keyed by (model weights version, image content hash).
+# Memory tier: bounded LRU. Optional disk tier (XRAY_CACHE_DIR): one small
+# JSON file per entry, so results survive restarts and are shared by workers.
+
+CACHE_SIZE = int(os.environ.get('XRAY_CACHE_SIZE', 1024))
+CACHE_DIR = os.environ.get('XRAY_CACHE_DIR', '')
+
+
+class ResultCache:
+
+    def __init__(self, weights_version, maxsize=CACHE_SIZE, disk_dir=CACHE_DIR):
+        self.weights_version = weights_version
+        self.maxsize = maxsize
+        self.disk_dir = os.path.join(disk_dir, weights_version) if disk_dir else None
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _disk_path(self, digest):
+        return os.path.join(self.disk_dir, f"{digest}.json")
+
+    def get(self, digest):
+        with self.lock:
+            if digest in self.entries:
+                self.entries.move_to_end(digest)
+                self.hits += 1
+                return self.entries[digest]
+
+        if self.disk_dir and os.path.exists(self._disk_path(digest)):
+            try:
+                with open(self._disk_path(digest)) as f:
+                    value = json.load(f)
+                self._remember(digest, value)
+                with self.lock:
+                    self.disk_hits += 1
+                return value
+            except (OSError, ValueError) as e:
+                print(f"Cache Read Error: {e}")
+
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def _remember(self, digest, value):
+        with self.lock:
+            self.entries[digest] = value
+            self.entries.move_to_end(digest)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def put(self, digest, value):
+        self._remember(digest, value)
+        if self.disk_dir:
+            path = self._disk_path(digest)
+            tmp_path = f"{path}.tmp{os.getpid()}"
+            try:
+                with open(tmp_path, 'w') as f:
+                    json.dump(value, f)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"Cache Write Error: {e}")
+
+    def stats(self):
+        with self.lock:
+            return {
+                "weights_version": self.weights_version,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+                "disk_tier": bool(self.disk_dir),
+            }
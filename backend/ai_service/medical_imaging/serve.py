@@ -0,0 +1,99 @@
+import os
+import sys
+import time
+import socket
+import signal
+from model import load_model, share_model, set_threads
+
+# Production serving: N pre-forked worker processes behind one listening socket.
+# The parent loads DenseNet121 once and moves the weights to shared memory, so
+# every worker maps the same pages instead of holding its own copy. Each worker
+# pins torch's intra-op / inter-op thread pools, then runs the Flask app with
+# its own micro-batcher. Workers that exit are restarted.
+#
+# Run from this directory: python serve.py  (CPU only; use loadtest.py to pick the split)
+# Needs os.fork, i.e. Linux or macOS. On Windows run app.py (one process) instead.
+
+CPU_COUNT = os.cpu_count() or 1
+WORKERS = int(os.environ.get('XRAY_WORKERS', 2))
+INTRA_OP_THREADS = int(os.environ.get('XRAY_INTRA_OP_THREADS', max(1, CPU_COUNT // WORKERS)))
+INTER_OP_THREADS = int(os.environ.get('XRAY_INTER_OP_THREADS', 1))
+HOST = os.environ.get('XRAY_HOST', '127.0.0.1')
+PORT = int(os.environ.get('XRAY_PORT', 5003))
+BACKLOG = 128
+RESTART_DELAY = 1.0 # seconds before replacing a worker that exited
+
+
+def run_worker(index, sock):
+    # Runs in the forked child: pin threads first, then start the app's own threads
+    os.environ['XRAY_WORKER_INDEX'] = str(index)
+    set_threads(INTRA_OP_THREADS, INTER_OP_THREADS)
+    from werkzeug.serving import make_server
+    import app
+
+    server = make_server(HOST, PORT, app.app, threaded=True, fd=sock.fileno())
+    print(f"Worker {index} (pid {os.getpid()}) serving with {INTRA_OP_THREADS} intra-op / {INTER_OP_THREADS} inter-op threads")
+    server.serve_forever()
+
+
+def main():
+    if not hasattr(os, 'fork'):
+        sys.exit("serve.py pre-forks workers with os.fork, which this platform (Windows) lacks; run app.py (single process) instead")
+    # Load once in the parent; no forward pass here, workers warm up after forking
+    model, device = load_model()
+    if device.type != 'cpu':
+        sys.exit("serve.py forks CPU workers; on a GPU node run app.py (single process) instead")
+    share_model(model, device)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((HOST, PORT))
+    sock.listen(BACKLOG)
+    sock.set_inheritable(True)
+
+    children = {}
+    stopping = False
+
+    def spawn(index):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                run_worker(index, sock)
+            finally:
+                os._exit(1)
+        children[pid] = index
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    print(f"Medical Imaging AI Service: {WORKERS} workers x {INTRA_OP_THREADS} threads on {HOST}:{PORT} ({CPU_COUNT} CPUs)")
+    for index in range(WORKERS):
+        spawn(index)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        index = children.pop(pid, None)
+        if index is not None and not stopping:
+            print(f"Worker {index} (pid {pid}) exited with status {status}, restarting...")
+            time.sleep(RESTART_DELAY)
+            spawn(index)
+
+
+if __name__ == '__main__':
+    main()
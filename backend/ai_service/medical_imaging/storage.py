@@ -0,0 +1,48 @@
+import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+# Optional, asynchronous, content-addressed persistence of uploads.
+# Inference never waits on disk: the bytes are already decoded in memory,
+# and a background writer stores them as uploads/<sha256><ext>, so identical
+# studies are written once and different studies can never overwrite each other.
+
+UPLOAD_FOLDER = 'uploads'
+PERSIST_UPLOADS = os.environ.get('XRAY_PERSIST_UPLOADS', '1') == '1'
+
+writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='upload-writer')
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def upload_path(digest, filename):
+    ext = os.path.splitext(filename or '')[1].lower()
+    if not ext or len(ext) > 6 or not ext[1:].isalnum():
+        ext = '.bin'
+    return os.path.join(UPLOAD_FOLDER, f"{digest}{ext}")
+
+
+def _write(path, data):
+    if os.path.exists(path):
+        return path
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Upload Persist Error: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+
+def persist_upload(data, digest, filename):
+    # Queue the write and return immediately; None when persistence is disabled
+    if not PERSIST_UPLOADS:
+        return None
+    path = upload_path(digest, filename)
+    writer.submit(_write, path, data)
+    return path
@@ -234,7 +234,8 @@ INSERT INTO Roles (role_name) SELECT 'Receptionist' WHERE NOT EXISTS (SELECT * F
 CREATE TABLE ai_faces (
     face_id INTEGER(10) PRIMARY KEY AUTO_INCREMENT,
     user_id INTEGER(10) NOT NULL,
-    embedding JSON NOT NULL,
+    embedding JSON NULL,
+    embedding_bin BLOB NULL,
     created_at DATETIME NOT NULL,
     FOREIGN KEY (user_id) REFERENCES Users(user_id)
 );
@@ -3,17 +3,30 @@ import { Activity, CheckCircle, AlertTriangle, RefreshCw, Stethoscope } from 'lu
 import { motion, AnimatePresence } from 'framer-motion';
 
 const DiseasePrediction = () => {
-    // These match exactly what the python script was trained with (minus 'Symptom_' prefix)
-    const symptomsList = [
+    // Fallback until the catalog loads (matches the trained features minus 'Symptom_' prefix)
+    const defaultSymptoms = [
         'Fever', 'Cough', 'Fatigue', 'Headache',
         'SoreThroat', 'BodyPain', 'RunnyNose', 'Breathlessness'
-    ];
+    ].map(id => ({ id, display_name: id.replace(/([A-Z])/g, ' $1').trim() }));
 
+    const [symptomsList, setSymptomsList] = useState(defaultSymptoms);
     const [selectedSymptoms, setSelectedSymptoms] = useState([]);
     const [result, setResult] = useState(null);
     const [loading, setLoading] = useState(false);
     const [error, setError] = useState('');
 
+    // Catalog is served with an ETag, so repeat visits only revalidate it
+    useEffect(() => {
+        fetch('http://localhost:5004/symptoms')
+            .then(res => res.json())
+            .then(data => {
+                if (data.status === 'success' && data.catalog && data.catalog.length > 0) {
+                    setSymptomsList(data.catalog);
+                }
+            })
+            .catch(() => { });
+    }, []);
+
     const toggleSymptom = (symptom) => {
         if (selectedSymptoms.includes(symptom)) {
             setSelectedSymptoms(selectedSymptoms.filter(s => s !== symptom));
@@ -80,15 +93,15 @@ const DiseasePrediction = () => {
                             <div className="d-flex flex-wrap gap-2 mb-4">
                                 {symptomsList.map(sym => (
                                     <button
-                                        key={sym}
-                                        onClick={() => toggleSymptom(sym)}
-                                        className={`btn rounded-pill px-4 py-2 border transition-all ${selectedSymptoms.includes(sym)
+                                        key={sym.id}
+                                        onClick={() => toggleSymptom(sym.id)}
+                                        className={`btn rounded-pill px-4 py-2 border transition-all ${selectedSymptoms.includes(sym.id)
                                                 ? 'btn-primary shadow-sm'
                                                 : 'btn-outline-secondary bg-light text-dark border-0'
                                             }`}
                                     >
-                                        {selectedSymptoms.includes(sym) && <CheckCircle size={16} className="me-2 inline-block" />}
-                                        {sym.replace(/([A-Z])/g, ' $1').trim()}
+                                        {selectedSymptoms.includes(sym.id) && <CheckCircle size={16} className="me-2 inline-block" />}
+                                        {sym.display_name}
                                     </button>
                                 ))}
                             </div>
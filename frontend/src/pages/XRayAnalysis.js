@@ -105,7 +105,7 @@ const XRayAnalysis = () => {
                                     className="position-absolute w-100 h-100 opacity-0"
                                     style={{ cursor: 'pointer' }}
                                     onChange={handleFileSelect}
-                                    accept="image/*"
+                                    accept="image/*,.dcm,.dicom,.tif,.tiff"
                                 />
 
                                 {preview ? (